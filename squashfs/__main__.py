@@ -1,19 +1,340 @@
+import argparse
 import datetime
+import json
+import stat as stat_
 import sys
+from typing import Iterator, List, Optional, Set, Tuple
 
+from .common import SquashError
 from .image import Image
+from .index import build_index
+from .inode import Inode
+from .server import CHUNK_SIZE, serve
 
 
-def main() -> None:
-    with Image(sys.argv[1]) as image:
-        f = image.open(sys.argv[2])
+def _open(args: argparse.Namespace, lazy: bool = False) -> Image:
+    return Image(args.image, lazy=lazy, index=getattr(args, "index", None))
 
-        print("Size:", f.size)
-        print("Permission:", oct(f.permissions))
-        print("UID:", f.uid)
-        print("GID:", f.gid)
-        print("Modtime:", datetime.datetime.fromtimestamp(f.modified_time))
-        print("Xattrs:", f.xattrs)
+
+def _file_type(inode: Inode) -> int:
+    if inode.is_dir:
+        return stat_.S_IFDIR
+    if inode.is_file:
+        return stat_.S_IFREG
+    if inode.is_symlink:
+        return stat_.S_IFLNK
+    if inode.is_block_dev:
+        return stat_.S_IFBLK
+    if inode.is_char_dev:
+        return stat_.S_IFCHR
+    if inode.is_fifo:
+        return stat_.S_IFIFO
+
+    return stat_.S_IFSOCK
+
+
+def _link_count(inode: Inode) -> int:
+    # Basic regular file inodes do not store a link count; they have one link
+    return max(inode.hard_link_count, 1)
+
+
+def _size(inode: Inode) -> int:
+    # Like ls and stat, report the length of the target for symlinks
+    if inode.is_symlink:
+        return inode.target_size
+
+    return inode.file_size
+
+
+def _format_time(timestamp: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def _format_size(size: int, human: bool) -> str:
+    if not human:
+        return str(size)
+
+    value = float(size)
+    for unit in "BKMGT":
+        if value < 1024 or unit == "T":
+            break
+        value /= 1024
+
+    return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+
+
+def _long_line(image: Image, inode: Inode, name: str, human: bool) -> str:
+    if inode.is_block_dev or inode.is_char_dev:
+        size = f"{inode.major}, {inode.minor}"
+    else:
+        size = _format_size(_size(inode), human)
+
+    line = (
+        f"{stat_.filemode(_file_type(inode) | inode.permissions)} "
+        f"{_link_count(inode):>3} "
+        f"{image.ids[inode.uid_idx]:>5} {image.ids[inode.gid_idx]:>5} "
+        f"{size:>10} {_format_time(inode.modified_time)} {name}"
+    )
+    if inode.is_symlink:
+        line += " -> " + inode.target_path.decode(errors="replace")
+
+    return line
+
+
+def ls(args: argparse.Namespace) -> None:
+    with _open(args) as image:
+        path = "/".join(p for p in args.path.split("/") if p)
+        inode = image.get_inode(path)
+        if not inode.is_dir:
+            if args.long:
+                print(_long_line(image, inode, args.path, args.human_readable))
+            else:
+                print(args.path)
+            return
+
+        stack = [path]
+        first = True
+        while stack:
+            top = stack.pop()
+            if args.recursive:
+                if not first:
+                    print()
+                print(f"{top or '.'}:")
+            first = False
+
+            subdirs = []
+            for entry in sorted(image.scandir(top), key=lambda e: e.name):
+                if args.long:
+                    print(
+                        _long_line(
+                            image, entry.inode(), entry.name, args.human_readable
+                        )
+                    )
+                else:
+                    print(entry.name)
+                if args.recursive and entry.is_dir():
+                    subdirs.append(entry.path)
+
+            # Visit subdirectories in name order
+            stack.extend(reversed(subdirs))
+
+
+def stat(args: argparse.Namespace) -> None:
+    with _open(args) as image:
+        info = image.stat(args.path)
+        inode = info.inode
+
+        print("File:", args.path)
+        print("Type:", _type_name(inode))
+        print("Inode:", inode.inode_number)
+        print("Links:", _link_count(inode))
+        print("Size:", _size(inode))
+        if inode.is_file:
+            print("Blocks:", len(inode.blk_sizes))
+            print(
+                "Fragment:",
+                "no" if inode.fragment_blk_index == 0xFFFFFFFF else "yes",
+            )
+        if inode.is_block_dev or inode.is_char_dev:
+            print("Device:", f"{inode.major}, {inode.minor}")
+        if inode.is_symlink:
+            print("Target:", inode.target_path.decode(errors="replace"))
+        print(
+            "Permission:",
+            oct(info.permissions),
+            stat_.filemode(_file_type(inode) | info.permissions),
+        )
+        print("UID:", info.uid)
+        print("GID:", info.gid)
+        print("Modtime:", datetime.datetime.fromtimestamp(info.modified_time))
+        print("Xattrs:", info.xattrs)
+
+
+def _type_name(inode: Inode) -> str:
+    return {
+        stat_.S_IFDIR: "directory",
+        stat_.S_IFREG: "regular file",
+        stat_.S_IFLNK: "symbolic link",
+        stat_.S_IFBLK: "block device",
+        stat_.S_IFCHR: "character device",
+        stat_.S_IFIFO: "fifo",
+        stat_.S_IFSOCK: "socket",
+    }[_file_type(inode)]
+
+
+def cat(args: argparse.Namespace) -> None:
+    out = sys.stdout.buffer
+    with _open(args) as image:
+        for path in args.paths:
+            f = image.open_raw(path)
+            while True:
+                # Uncompressed blocks are written straight from the image
+                view = f.readview(CHUNK_SIZE)
+                if not view:
+                    break
+                out.write(view)
+    out.flush()
+
+
+def extract(args: argparse.Namespace) -> None:
+    with _open(args) as image:
+        image.extract(args.src, args.dest, workers=args.jobs)
+
+
+def _du(
+    image: Image, path: str, seen: Set[int], depth: int
+) -> Iterator[Tuple[int, str, int]]:
+    """Yield (size, path, depth) of ``path`` and its subdirectories in
+    post-order. Hard-linked files are only counted once."""
+    total = 0
+    for entry in image.scandir(path):
+        if entry.is_dir():
+            # The last result is the total of the subdirectory itself
+            for result in _du(image, entry.path, seen, depth + 1):
+                yield result
+            total += result[0]
+        elif entry.inode_number not in seen:
+            seen.add(entry.inode_number)
+            total += entry.inode().file_size
+
+    yield total, path, depth
+
+
+def du(args: argparse.Namespace) -> None:
+    with _open(args) as image:
+        path = "/".join(p for p in args.path.split("/") if p)
+        if not image.get_inode(path).is_dir:
+            size = image.stat(path).size
+            print(f"{_format_size(size, args.human_readable)}\t{args.path}")
+            return
+
+        for size, dirpath, depth in _du(image, path, set(), 0):
+            if depth == 0 or not args.summarize:
+                print(f"{_format_size(size, args.human_readable)}\t{dirpath or '.'}")
+
+
+def bench(args: argparse.Namespace) -> None:
+    from .bench import measure
+
+    print(json.dumps(measure(args.image, args.seed), indent=2))
+
+
+def verify(args: argparse.Namespace) -> None:
+    # Lazily, so that corrupt metadata blocks are reported rather than fatal
+    with _open(args, lazy=True) as image:
+        errors = image.verify(args.jobs)
+
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(1)
+
+
+def manifest(args: argparse.Namespace) -> None:
+    with _open(args, lazy=True) as image:
+        digests = image.manifest(args.jobs)
+
+    # Same format as sha256sum, so that extracted trees can be checked with -c
+    for path, digest in digests.items():
+        print(f"{digest}  {path}")
+
+
+def index(args: argparse.Namespace) -> None:
+    with Image(args.image) as image:
+        build_index(image, args.output or args.image + ".idx")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m squashfs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_ls = subparsers.add_parser("ls", help="list directory contents")
+    parser_ls.add_argument("image")
+    parser_ls.add_argument("path", nargs="?", default="")
+    parser_ls.add_argument("-l", dest="long", action="store_true")
+    parser_ls.add_argument("-R", dest="recursive", action="store_true")
+    parser_ls.add_argument("-H", "--human-readable", action="store_true")
+    parser_ls.set_defaults(func=ls)
+
+    parser_stat = subparsers.add_parser("stat", help="show file metadata")
+    parser_stat.add_argument("image")
+    parser_stat.add_argument("path")
+    parser_stat.set_defaults(func=stat)
+
+    parser_cat = subparsers.add_parser("cat", help="write files to stdout")
+    parser_cat.add_argument("image")
+    parser_cat.add_argument("paths", nargs="+", metavar="path")
+    parser_cat.set_defaults(func=cat)
+
+    parser_extract = subparsers.add_parser("extract", help="extract files")
+    parser_extract.add_argument("image")
+    parser_extract.add_argument("src", nargs="?", default="")
+    parser_extract.add_argument("-d", "--dest", default=".")
+    parser_extract.add_argument("-j", "--jobs", type=int, default=1)
+    parser_extract.set_defaults(func=extract)
+
+    parser_du = subparsers.add_parser("du", help="summarize file sizes")
+    parser_du.add_argument("image")
+    parser_du.add_argument("path", nargs="?", default="")
+    parser_du.add_argument("-s", "--summarize", action="store_true")
+    parser_du.add_argument("-H", "--human-readable", action="store_true")
+    parser_du.set_defaults(func=du)
+
+    parser_bench = subparsers.add_parser("bench", help="run read and lookup benchmarks")
+    parser_bench.add_argument("image")
+    parser_bench.add_argument("--seed", type=int, default=0)
+    parser_bench.set_defaults(func=bench)
+
+    parser_verify = subparsers.add_parser(
+        "verify", help="check that every block decompresses"
+    )
+    parser_verify.add_argument("image")
+    parser_verify.add_argument("-j", "--jobs", type=int, default=1)
+    parser_verify.set_defaults(func=verify)
+
+    parser_manifest = subparsers.add_parser(
+        "manifest", help="print the SHA-256 of every file"
+    )
+    parser_manifest.add_argument("image")
+    parser_manifest.add_argument("-j", "--jobs", type=int, default=1)
+    parser_manifest.set_defaults(func=manifest)
+
+    for subparser in (
+        parser_ls,
+        parser_stat,
+        parser_cat,
+        parser_extract,
+        parser_du,
+        parser_verify,
+        parser_manifest,
+    ):
+        subparser.add_argument("--index", help="sidecar index to open the image with")
+
+    parser_index = subparsers.add_parser("index", help="build a sidecar index")
+    parser_index.add_argument("image")
+    parser_index.add_argument("-o", "--output", help="default: IMAGE.idx")
+    parser_index.set_defaults(func=index)
+
+    parser_serve = subparsers.add_parser("serve", help="serve an image over HTTP")
+    parser_serve.add_argument("image")
+    parser_serve.add_argument("--host", default="127.0.0.1")
+    parser_serve.add_argument("--port", type=int, default=8000)
+    parser_serve.add_argument("--lazy", action="store_true")
+    parser_serve.add_argument("--index", help="sidecar index to open the image with")
+    parser_serve.set_defaults(
+        func=lambda args: serve(
+            args.image, args.host, args.port, lazy=args.lazy, index=args.index
+        )
+    )
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except SquashError as e:
+        parser.exit(1, f"{parser.prog}: error: {str(e) or type(e).__name__}\n")
+    except BrokenPipeError:
+        # The reader of stdout (e.g. head) went away
+        sys.stderr.close()
 
 
 if __name__ == "__main__":
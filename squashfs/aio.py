@@ -0,0 +1,174 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+from .common import NotAFileError
+from .file import File
+from .image import Image
+from .info import Info
+from .inode import Inode
+
+T = TypeVar("T")
+
+
+class AsyncImage:
+    """asyncio front end of ``Image``.
+
+    Everything that may decompress metadata or data blocks runs on
+    ``executor`` (a thread pool by default) so that the event loop is never
+    blocked by decompression. Concurrent reads of the same data or fragment
+    block share a single in-flight decompression.
+
+    Opening an image inflates its metadata tables unless ``lazy`` is set, so
+    use ``AsyncImage.open`` to open it on the executor. The constructor opens
+    the image synchronously, or takes ownership of an already opened one.
+
+    >>> async with await AsyncImage.open("image.sfs") as image:
+    ...     async for chunk in image.stream("large.bin"):
+    ...         ...
+    """
+
+    def __init__(
+        self,
+        file: Any,
+        executor: Optional[Executor] = None,
+        readahead: int = 4,
+        **kwargs: Any,
+    ) -> None:
+        self.image = file if isinstance(file, Image) else Image(file, **kwargs)
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max(self.image.workers, 4))
+        # Number of blocks of a stream in flight, including the one awaited
+        self.readahead = readahead
+        # on-disk offset -> decompression in progress
+        self._inflight: Dict[int, "asyncio.Future[memoryview]"] = {}
+
+    @classmethod
+    async def open(
+        cls,
+        file: Any,
+        executor: Optional[Executor] = None,
+        readahead: int = 4,
+        **kwargs: Any,
+    ) -> "AsyncImage":
+        """Open an image on ``executor`` (the default executor of the event
+        loop if None) instead of the event loop."""
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(
+            executor, functools.partial(Image, file, **kwargs)
+        )
+
+        return cls(image, executor, readahead)
+
+    async def get_inode(self, path: str) -> Inode:
+        return await self._run(self.image.get_inode, path)
+
+    async def stat(self, path: str) -> Info:
+        return await self._run(self.image.stat, path)
+
+    async def listdir(self, path: str = "") -> List[str]:
+        return await self._run(self.image.listdir, path)
+
+    async def read(self, path: str, offset: int = 0, size: int = -1) -> bytes:
+        """Read ``size`` bytes (or up to the end of the file if negative)
+        starting at ``offset``."""
+        return b"".join([chunk async for chunk in self.stream(path, offset, size)])
+
+    async def stream(
+        self, path: str, offset: int = 0, size: int = -1
+    ) -> AsyncIterator[bytes]:
+        """Iterate over the contents of a file one block at a time, keeping up
+        to ``readahead`` blocks in flight."""
+        inode = await self.get_inode(path)
+        if not inode.is_file:
+            raise NotAFileError
+
+        f = File(self.image, inode)
+        blk_size = f.blk_size
+        end = f.size if size < 0 else min(f.size, offset + size)
+        if offset >= end:
+            return
+
+        first = offset // blk_size
+        last = (end - 1) // blk_size
+        tasks: List["asyncio.Future[memoryview]"] = []
+        idx = first
+
+        try:
+            while idx <= last or tasks:
+                while idx <= last and len(tasks) < max(self.readahead, 1):
+                    tasks.append(asyncio.ensure_future(self._read_blk(f, idx)))
+                    idx += 1
+
+                blk_idx = idx - len(tasks)
+                blk = await tasks.pop(0)
+
+                start = max(offset - blk_idx * blk_size, 0)
+                stop = min(end - blk_idx * blk_size, len(blk))
+                yield bytes(blk[start:stop])
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _read_blk(self, f: File, idx: int) -> memoryview:
+        """Return data block ``idx`` (or the tail end) of a file. Only blocks
+        that must be decompressed go through the executor."""
+        image = self.image
+        inode = f.inode
+
+        if idx < len(f.blk_offsets):
+            offset = f.blk_offsets[idx]
+            size = inode.blk_sizes[idx]
+            # Sparse and uncompressed blocks are views into the image
+            if size == 0 or size & (1 << 24):
+                return image._read_data_blk(offset, size)
+
+            return await self._coalesce(offset, image._read_data_blk, offset, size)
+
+        if inode.fragment_blk_index == 0xFFFFFFFF:
+            return memoryview(b"")
+
+        entry = image.fragments[inode.fragment_blk_index]
+        if entry.is_compressed:
+            fragment = await self._coalesce(
+                entry.start, image._read_fragment, inode.fragment_blk_index
+            )
+        else:
+            fragment = image._read_fragment(inode.fragment_blk_index)
+
+        start = inode.blk_offset
+        return fragment[start : start + inode.file_size % f.blk_size]
+
+    async def _coalesce(
+        self, key: int, fn: Callable[..., memoryview], *args: Any
+    ) -> memoryview:
+        if key in self.image.block_cache:
+            return fn(*args)
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(fn, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # A cancelled reader must not cancel the decompression for the others
+        return await asyncio.shield(future)
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def close(self) -> None:
+        if self._own_executor:
+            # Wait for running decompressions without blocking the event loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.executor.shutdown)
+        self.image.close()
+
+    async def __aenter__(self) -> "AsyncImage":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
@@ -0,0 +1,103 @@
+"""Vectorized decoding of fixed-width tables, used when NumPy is installed.
+
+NumPy is only imported on first use, and only for tables large enough that
+the conversion to and from arrays pays off. The helpers returning arrays
+raise ``SquashError`` if NumPy is missing; ``decode_uint32`` falls back to
+``struct``.
+"""
+import importlib
+import importlib.util
+import struct
+from typing import Any, List, Sequence, Tuple
+
+from .common import SquashError
+from .fragment import FragmentTable
+
+HAVE_NUMPY = importlib.util.find_spec("numpy") is not None
+
+# Number of entries from which NumPy is faster than a Python loop or struct
+NUMPY_MIN_SIZE = 4096
+
+_np: Any = None
+_fragment_dtype: Any = None
+
+
+def _numpy() -> Any:
+    global _np
+
+    if _np is None:
+        if not HAVE_NUMPY:
+            raise SquashError("This operation requires NumPy")
+        _np = importlib.import_module("numpy")
+
+    return _np
+
+
+def fragment_dtype() -> Any:
+    """Layout of a fragment table entry."""
+    global _fragment_dtype
+
+    if _fragment_dtype is None:
+        _fragment_dtype = _numpy().dtype(
+            [("start", "<u8"), ("size", "<u4"), ("unused", "<u4")]
+        )
+
+    return _fragment_dtype
+
+
+def decode_uint32(buffer: bytes, count: int) -> List[int]:
+    """Decode ``count`` little-endian uint32s, e.g. the ID table."""
+    if HAVE_NUMPY and count >= NUMPY_MIN_SIZE:
+        return list(_numpy().frombuffer(buffer, "<u4", count).tolist())
+
+    return list(struct.unpack_from(f"<{count}I", buffer))
+
+
+def fragment_array(table: FragmentTable) -> Any:
+    """Return the fragment table as a structured array with ``start``,
+    ``size`` and ``unused`` fields. ``size`` keeps the uncompressed bit."""
+    return _numpy().frombuffer(table.buffer, fragment_dtype(), table.count)
+
+
+def as_array(sizes: Sequence[int]) -> Any:
+    """View a block size list (such as ``Inode.blk_sizes``) as a uint32
+    array, without copying when possible."""
+    np = _numpy()
+
+    return np.asarray(sizes, dtype=np.uint32)
+
+
+def compressed_mask(sizes: Any) -> Any:
+    """Mask of the blocks or fragments that are stored compressed."""
+    sizes = as_array(sizes)
+
+    return (sizes & (1 << 24)) == 0
+
+
+def stored_sizes(sizes: Any) -> Any:
+    """On-disk size of each block, without the uncompressed bit."""
+    return as_array(sizes) & ~_numpy().uint32(1 << 24)
+
+
+def block_offsets(start: int, sizes: Any) -> Any:
+    """On-disk offset of each data block of a file starting at ``start``
+    (``Inode.blks_start``)."""
+    np = _numpy()
+    stored = stored_sizes(sizes).astype(np.uint64)
+    offsets = np.empty(len(stored), dtype=np.uint64)
+
+    if len(stored):
+        offsets[0] = start
+        np.cumsum(stored[:-1], out=offsets[1:])
+        offsets[1:] += np.uint64(start)
+
+    return offsets
+
+
+def size_totals(sizes: Any) -> Tuple[int, int]:
+    """Return the total on-disk size of the compressed blocks and of the
+    blocks stored uncompressed."""
+    mask = compressed_mask(sizes)
+    stored = stored_sizes(sizes).astype(_numpy().uint64)
+
+    return int(stored[mask].sum()), int(stored[~mask].sum())
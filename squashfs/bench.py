@@ -0,0 +1,294 @@
+"""Benchmarks on synthetic images.
+
+Images of several shapes are generated with ``Writer`` and measured for open
+latency, path lookup, listing and read throughput, and peak memory usage.
+Results are printed as JSON so that runs can be compared across commits::
+
+    python -m squashfs.bench --out before.json
+    python -m squashfs.bench --compare before.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .image import Image
+from .writer import Writer
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+# Upper bound on the number of bytes read by the sequential read benchmark
+SEQ_READ_LIMIT = 256 << 20
+# Number and size of the reads issued by the random read benchmark
+RANDOM_READS = 2000
+RANDOM_READ_SIZE = 4096
+# Number of paths resolved by the lookup benchmarks
+LOOKUPS = 2000
+
+
+class _Data:
+    """Deterministic, moderately compressible file contents."""
+
+    def __init__(self, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        words = [
+            bytes(rng.choice(b"abcdefghijklmnopqrstuvwxyz") for _ in range(8))
+            for _ in range(256)
+        ]
+        self.pool = b" ".join(rng.choice(words) for _ in range(256 << 10))
+        self.rng = rng
+
+    def __call__(self, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            n = min(size, len(self.pool) // 2)
+            start = self.rng.randrange(len(self.pool) - n + 1)
+            chunks.append(self.pool[start : start + n])
+            size -= n
+
+        return b"".join(chunks)
+
+
+def _tiny_files(writer: Writer, data: _Data, scale: float) -> None:
+    for i in range(int(20000 * scale)):
+        writer.add_file(f"d{i % 100:03d}/f{i:06d}", data(data.rng.randrange(64)))
+
+
+def _huge_files(writer: Writer, data: _Data, scale: float) -> None:
+    for i in range(4):
+        writer.add_file(f"huge{i}", data(int((32 << 20) * scale)))
+
+
+def _deep_tree(writer: Writer, data: _Data, scale: float) -> None:
+    for i in range(int(200 * scale)):
+        path = "/".join(f"level{j}" for j in range(i % 50 + 1))
+        writer.add_file(f"t{i % 4}/{path}/f{i:05d}", data(data.rng.randrange(4096)))
+
+
+def _wide_directory(writer: Writer, data: _Data, scale: float) -> None:
+    for i in range(int(50000 * scale)):
+        writer.add_file(f"wide/entry-{i:07d}", data(data.rng.randrange(32)))
+
+
+def _fragments(writer: Writer, data: _Data, scale: float) -> None:
+    blk_size = writer.blk_size
+    for i in range(int(5000 * scale)):
+        size = data.rng.randrange(blk_size * 2)
+        writer.add_file(f"d{i % 20:02d}/f{i:05d}", data(size))
+
+
+# Shape name -> function populating a Writer
+SHAPES: Dict[str, Callable[[Writer, _Data, float], None]] = {
+    "tiny_files": _tiny_files,
+    "huge_files": _huge_files,
+    "deep_tree": _deep_tree,
+    "wide_directory": _wide_directory,
+    "fragments": _fragments,
+}
+
+
+def generate(
+    shape: str, path: str, scale: float = 1.0, compression_id: int = 1
+) -> None:
+    """Write a synthetic image of the given shape to ``path``. The contents
+    only depend on the shape and scale."""
+    writer = Writer(
+        compression_id=compression_id,
+        workers=os.cpu_count() or 1,
+        use_processes=True,
+        modified_time=0,
+    )
+    SHAPES[shape](writer, _Data(), scale)
+    writer.write(path)
+
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> float:
+    """Return the median run time of ``fn`` in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def _peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process in KiB."""
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure(path: str, seed: int = 0) -> Dict[str, Any]:
+    """Measure an image. Every phase starts from a freshly opened image except
+    for warm lookups, which reuse the caches filled by the cold lookups."""
+    rng = random.Random(seed)
+    results: Dict[str, Any] = {"image_bytes": os.path.getsize(path)}
+
+    def open_close() -> None:
+        Image(path).close()
+
+    results["open_ms"] = _timeit(open_close, 20) * 1e3
+
+    with Image(path) as image:
+        start = time.perf_counter()
+        # Only regular files are looked up and read
+        files: List[str] = []
+        entries = 0
+        stack = [""]
+        while stack:
+            for entry in image.scandir(stack.pop()):
+                entries += 1
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry.path)
+        elapsed = time.perf_counter() - start
+        results["entries"] = entries
+        results["listing_entries_per_s"] = entries / elapsed if elapsed else None
+
+    paths = rng.sample(files, min(LOOKUPS, len(files)))
+    results["lookup_cold_us"] = results["lookup_warm_us"] = None
+
+    with Image(path) as image:
+        for phase in ("lookup_cold_us", "lookup_warm_us"):
+            start = time.perf_counter()
+            for p in paths:
+                image.get_inode(p)
+            if paths:
+                results[phase] = (time.perf_counter() - start) / len(paths) * 1e6
+
+    with Image(path) as image:
+        total = 0
+        start = time.perf_counter()
+        for p in files:
+            with image.open(p) as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+            if total >= SEQ_READ_LIMIT:
+                break
+        elapsed = time.perf_counter() - start
+        results["seq_read_mb_per_s"] = total / elapsed / 1e6 if total else None
+
+    with Image(path) as image:
+        sizes = {p: image.stat(p).size for p in files}
+        candidates = [p for p, size in sizes.items() if size > RANDOM_READ_SIZE]
+        candidates = candidates or [p for p, size in sizes.items() if size]
+
+        total = 0
+        start = time.perf_counter()
+        for _ in range(RANDOM_READS if candidates else 0):
+            p = rng.choice(candidates)
+            f = image.open_raw(p)
+            f.seek(rng.randrange(max(sizes[p] - RANDOM_READ_SIZE, 0) + 1))
+            total += len(f.read(RANDOM_READ_SIZE))
+        elapsed = time.perf_counter() - start
+        results["random_read_mb_per_s"] = total / elapsed / 1e6 if total else None
+
+    results["peak_rss_kib"] = _peak_rss()
+
+    return results
+
+
+def run(
+    shapes: List[str],
+    scale: float = 1.0,
+    compression_id: int = 1,
+    workdir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Generate and measure images of the given shapes. Each image is measured
+    in a child process so that peak memory usage is not shared between
+    shapes."""
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "compression_id": compression_id,
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for shape in shapes:
+            path = os.path.join(tmp, f"{shape}.sfs")
+            generate(shape, path, scale, compression_id)
+
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                report["results"][shape] = executor.submit(measure, path).result()
+
+            os.unlink(path)
+
+    return report
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any]) -> str:
+    """Format the ratio of each metric in ``report`` to ``baseline``."""
+    lines = []
+    for shape, results in report["results"].items():
+        base = baseline["results"].get(shape, {})
+        for name, value in results.items():
+            old = base.get(name)
+            if (
+                isinstance(value, (int, float))
+                and isinstance(old, (int, float))
+                and old
+            ):
+                lines.append(
+                    f"{shape:16} {name:24} {old:14.2f} {value:14.2f} {value / old:7.2f}x"
+                )
+
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--shape",
+        action="append",
+        choices=sorted(SHAPES),
+        help="shape to benchmark (default: all)",
+    )
+    parser.add_argument("--scale", type=float, default=1.0, help="image size factor")
+    parser.add_argument("--compression-id", type=int, default=1)
+    parser.add_argument("--workdir", help="directory for the generated images")
+    parser.add_argument("--out", help="write the results to this file")
+    parser.add_argument("--compare", help="results to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.shape or list(SHAPES), args.scale, args.compression_id, args.workdir
+    )
+    output = json.dumps(report, indent=2)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Least-recently-used cache bounded by the total size of its values.
+
+    ``sizeof`` returns the cost of a value (defaults to its length in bytes).
+    Pass ``lambda _: 1`` to bound the number of entries instead.
+
+    The cache is thread-safe. The lock is only held while the cache itself is
+    updated, and concurrent ``get_or_load`` misses on the same key are served
+    by a single call to the loader.
+    """
+
+    def __init__(self, capacity: int, sizeof: Callable[[V], int] = len) -> None:  # type: ignore
+        self.capacity = capacity
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+        # key -> result of the load in progress
+        self._loading: Dict[K, "Future[V]"] = {}
+        self._lock = Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        size = self.sizeof(value)
+
+        if size > self.capacity:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self.sizeof(old)
+
+            self._entries[key] = value
+            self.size += size
+
+            while self.size > self.capacity:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+                self.evictions += 1
+
+    def get_or_load(self, key: K, loader: Callable[[], V]) -> V:
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            future: "Future[V]" = Future()
+            loading = self._loading.setdefault(key, future)
+            if loading is future:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        # Another thread is loading the same key
+        if loading is not future:
+            return loading.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._loading[key]
+
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(size={self.size}, capacity={self.capacity}, hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
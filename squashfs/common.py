@@ -1,6 +1,7 @@
+import importlib
 import struct
 
-from typing import Tuple
+from typing import Any, Tuple
 
 
 class SquashError(Exception):
@@ -19,7 +20,21 @@ class NotAFileError(SquashError):
     pass
 
 
+class NotADirectoryError(SquashError):
+    pass
+
+
+def import_optional(name: str) -> Any:
+    """Import an optional dependency, returning None if it is unavailable."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
 class Mixin:
+    __slots__ = ()
+
     def _read_int16(self, mm: memoryview, offset: int) -> Tuple[int, int]:
         (val,) = struct.unpack_from("<h", mm, offset)
         return val, offset + 2
@@ -37,4 +52,7 @@ class Mixin:
         return val, offset + 8
 
     def _read_string(self, mm: memoryview, offset: int, size: int) -> Tuple[bytes, int]:
+        if offset + size > len(mm):
+            raise ReadError("Unexpected end of buffer")
+
         return mm[offset : offset + size].tobytes(), offset + size
@@ -0,0 +1,205 @@
+import lzma
+import threading
+import zlib
+from typing import Any, Dict, Type
+
+from .common import import_optional, Mixin, ReadError
+
+zstandard = import_optional("zstandard")
+lz4_block = import_optional("lz4.block")
+lzo = import_optional("lzo")
+
+
+class Compressor(Mixin):
+    """Base class of the codecs used for data and metadata blocks.
+
+    Subclasses set ``id`` to the compression ID stored in the superblock and
+    parse their compressor options (if any) in ``read_options``. ``compress``
+    is used by the writer.
+    """
+
+    id = 0
+    name = ""
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        raise NotImplementedError
+
+    def compress(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+# Compression ID -> compressor class
+COMPRESSORS: Dict[int, Type[Compressor]] = {}
+
+# Compression ID -> name of the module required by an unavailable compressor
+MISSING_MODULES: Dict[int, str] = {}
+
+
+def register_compressor(cls: Type[Compressor]) -> Type[Compressor]:
+    COMPRESSORS[cls.id] = cls
+    MISSING_MODULES.pop(cls.id, None)
+
+    return cls
+
+
+def get_compressor(compression_id: int) -> Compressor:
+    cls = COMPRESSORS.get(compression_id)
+
+    if cls is None:
+        if compression_id in MISSING_MODULES:
+            raise ReadError(
+                f"Compression ID {compression_id} requires the "
+                f"{MISSING_MODULES[compression_id]} module"
+            )
+        raise ReadError(f"Unknown compression ID {compression_id}")
+
+    return cls()
+
+
+@register_compressor
+class GzipCompressor(Compressor):
+    id = 1
+    name = "gzip"
+
+    def __init__(self) -> None:
+        self.compression_level = 9
+        self.window_size = 15
+        self.strategies = 0
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        self.compression_level, offset = self._read_uint32(mm, offset)
+        self.window_size, offset = self._read_uint16(mm, offset)
+        self.strategies, offset = self._read_uint16(mm, offset)
+
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        return zlib.decompress(data)
+
+    def compress(self, data: Any) -> bytes:
+        compressor = zlib.compressobj(
+            self.compression_level, zlib.DEFLATED, self.window_size
+        )
+        return compressor.compress(data) + compressor.flush()
+
+
+@register_compressor
+class LzmaCompressor(Compressor):
+    id = 2
+    name = "lzma"
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        return lzma.decompress(data, format=lzma.FORMAT_ALONE)
+
+    def compress(self, data: Any) -> bytes:
+        return lzma.compress(data, format=lzma.FORMAT_ALONE)
+
+
+class LzoCompressor(Compressor):
+    id = 3
+    name = "lzo"
+
+    def __init__(self) -> None:
+        self.algorithm = 0
+        self.compression_level = 0
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        self.algorithm, offset = self._read_uint32(mm, offset)
+        self.compression_level, offset = self._read_uint32(mm, offset)
+
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        return bytes(lzo.decompress(bytes(data), False, max_size))
+
+    def compress(self, data: Any) -> bytes:
+        return bytes(lzo.compress(bytes(data), self.compression_level or 1, False))
+
+
+@register_compressor
+class XzCompressor(Compressor):
+    id = 4
+    name = "xz"
+
+    def __init__(self) -> None:
+        self.dictionary_size = 0
+        self.executable_filters = 0
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        self.dictionary_size, offset = self._read_uint32(mm, offset)
+        self.executable_filters, offset = self._read_uint32(mm, offset)
+
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        return lzma.decompress(data, format=lzma.FORMAT_XZ)
+
+    def compress(self, data: Any) -> bytes:
+        return lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC32)
+
+
+class Lz4Compressor(Compressor):
+    id = 5
+    name = "lz4"
+
+    def __init__(self) -> None:
+        self.version = 1
+        self.flags = 0
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        self.version, offset = self._read_uint32(mm, offset)
+        self.flags, offset = self._read_uint32(mm, offset)
+
+        if self.version != 1:
+            raise ReadError(f"Unsupported LZ4 format version {self.version}")
+
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        return bytes(lz4_block.decompress(data, uncompressed_size=max_size))
+
+    def compress(self, data: Any) -> bytes:
+        return bytes(lz4_block.compress(data, store_size=False))
+
+
+class ZstdCompressor(Compressor):
+    id = 6
+    name = "zstd"
+
+    def __init__(self) -> None:
+        self.compression_level = 15
+        # Decompression contexts must not be shared between threads
+        self.local = threading.local()
+
+    def read_options(self, mm: memoryview, offset: int) -> int:
+        self.compression_level, offset = self._read_uint32(mm, offset)
+
+        return offset
+
+    def decompress(self, data: Any, max_size: int) -> bytes:
+        decompressor = getattr(self.local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self.local.decompressor = zstandard.ZstdDecompressor()
+
+        return bytes(decompressor.decompress(data, max_output_size=max_size))
+
+    def compress(self, data: Any) -> bytes:
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        return bytes(compressor.compress(data))
+
+
+for _cls, _module, _name in [
+    (LzoCompressor, lzo, "lzo"),
+    (Lz4Compressor, lz4_block, "lz4"),
+    (ZstdCompressor, zstandard, "zstandard"),
+]:
+    if _module is not None:
+        register_compressor(_cls)
+    else:
+        MISSING_MODULES[_cls.id] = _name
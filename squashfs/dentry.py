@@ -1,7 +1,21 @@
+import struct
+from typing import Optional, TYPE_CHECKING
+
 from .common import Mixin
+from .info import Info
+
+if TYPE_CHECKING:
+    from .image import Image
+    from .inode import Inode
+
+
+_DIRECTORY_ENTRY = struct.Struct("<HhHH")
+_DIRECTORY_INDEX = struct.Struct("<III")
 
 
 class DirectoryEntry(Mixin):
+    __slots__ = ("blk", "offset", "inode", "inode_offset", "type", "name_size", "name")
+
     def __init__(self) -> None:
         self.blk = 0
         self.offset = 0
@@ -12,16 +26,29 @@ class DirectoryEntry(Mixin):
         self.name = b""
 
     def read(self, mm: memoryview, offset: int) -> int:
-        self.offset, offset = self._read_uint16(mm, offset)
-        self.inode_offset, offset = self._read_int16(mm, offset)
-        self.type, offset = self._read_uint16(mm, offset)
-        self.name_size, offset = self._read_uint16(mm, offset)
+        (
+            self.offset,
+            self.inode_offset,
+            self.type,
+            self.name_size,
+        ) = _DIRECTORY_ENTRY.unpack_from(mm, offset)
+        offset += _DIRECTORY_ENTRY.size
         self.name, offset = self._read_string(mm, offset, self.name_size + 1)
 
         return offset
 
+    def pack(self) -> bytes:
+        return (
+            _DIRECTORY_ENTRY.pack(
+                self.offset, self.inode_offset, self.type, len(self.name) - 1
+            )
+            + self.name
+        )
+
 
 class DirectoryIndex(Mixin):
+    __slots__ = ("index", "start", "name_size", "name")
+
     def __init__(self) -> None:
         self.index = 0
         self.start = 0
@@ -29,9 +56,59 @@ class DirectoryIndex(Mixin):
         self.name = b""
 
     def read(self, mm: memoryview, offset: int) -> int:
-        self.index, offset = self._read_uint32(mm, offset)
-        self.start, offset = self._read_uint32(mm, offset)
-        self.name_size, offset = self._read_uint32(mm, offset)
+        self.index, self.start, self.name_size = _DIRECTORY_INDEX.unpack_from(
+            mm, offset
+        )
+        offset += _DIRECTORY_INDEX.size
         self.name, offset = self._read_string(mm, offset, self.name_size + 1)
 
         return offset
+
+    def pack(self) -> bytes:
+        return (
+            _DIRECTORY_INDEX.pack(self.index, self.start, len(self.name) - 1)
+            + self.name
+        )
+
+
+class DirEntry:
+    """Entry yielded by ``Image.scandir``, modelled after ``os.DirEntry``.
+
+    The file type comes from the directory entry itself; the inode is only
+    read when ``inode()`` or ``stat()`` is called.
+    """
+
+    __slots__ = ("image", "name", "path", "type", "inode_number", "inode_ref", "_inode")
+
+    def __init__(self, image: "Image", path: str, dent: DirectoryEntry) -> None:
+        self.image = image
+        self.name = dent.name.decode()
+        self.path = f"{path}/{self.name}" if path else self.name
+        self.type = dent.type
+        self.inode_number = dent.inode
+        self.inode_ref = (dent.blk << 16) | dent.offset
+        self._inode: Optional["Inode"] = None
+
+    # Directory entries always store the basic inode type
+    def is_dir(self) -> bool:
+        return self.type == 1
+
+    def is_file(self) -> bool:
+        return self.type == 2
+
+    def is_symlink(self) -> bool:
+        return self.type == 3
+
+    def inode(self) -> "Inode":
+        if self._inode is None:
+            self._inode = self.image._read_inode(
+                (self.inode_ref >> 16) & 0xFFFFFFFF, self.inode_ref & 0xFFFF
+            )
+
+        return self._inode
+
+    def stat(self) -> Info:
+        return Info(self.image, self.inode())
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.name!r}>"
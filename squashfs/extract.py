@@ -0,0 +1,199 @@
+import os
+import stat
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Set, Tuple, TYPE_CHECKING
+
+from .common import ReadError, SquashError
+from .file import File, SEEK_DATA, SEEK_HOLE
+from .info import Info
+
+if TYPE_CHECKING:
+    from .image import Image
+    from .inode import Inode
+
+# Number of data blocks written by a single extraction task
+CHUNK_BLKS = 32
+
+_O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+
+
+def _is_valid_name(name: bytes) -> bool:
+    """Whether a directory entry name stays within its directory."""
+    return name not in (b"", b".", b"..") and b"/" not in name and b"\0" not in name
+
+
+class Extractor:
+    """Extracts a subtree of an image to the local filesystem.
+
+    File contents are decompressed and written on a thread pool, one chunk of
+    ``CHUNK_BLKS`` data blocks per task, so large files are split across
+    workers and never held in memory as a whole. Ownership is only restored
+    when running as root.
+    """
+
+    def __init__(self, image: "Image", workers: int = 1) -> None:
+        self.image = image
+        self.workers = workers
+        self.chown = hasattr(os, "geteuid") and os.geteuid() == 0
+        # Entries whose metadata is restored once their contents are written
+        self.files: List[Tuple[str, "Inode"]] = []
+        self.dirs: List[Tuple[str, "Inode"]] = []
+        # inode number -> extracted path, to recreate hard links
+        self.links: Dict[int, str] = {}
+        self.pending: Set["Future[None]"] = set()
+
+    def extract(self, src: str, dest: str) -> None:
+        inode = self.image.get_inode(src)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            try:
+                self._extract(inode, dest, executor)
+                self._drain(0)
+            finally:
+                for future in self.pending:
+                    future.cancel()
+
+        for path, inode in self.files:
+            self._restore_metadata(path, inode)
+
+        # Restore directories deepest first so that their mtimes are final
+        for path, inode in reversed(self.dirs):
+            self._restore_metadata(path, inode)
+
+    def _extract(self, inode: "Inode", path: str, executor: ThreadPoolExecutor) -> None:
+        if inode.is_dir:
+            # Only directories created by this run get their metadata restored
+            if not os.path.lexists(path):
+                os.makedirs(path)
+                self.dirs.append((path, inode))
+
+            names: Set[bytes] = set()
+            for dent in self.image._read_dentries(inode):
+                # Names from a crafted image could escape the destination,
+                # e.g. a symlink followed by a directory of the same name
+                if not _is_valid_name(dent.name) or dent.name in names:
+                    warnings.warn(
+                        f"Skipping invalid or duplicate file name {dent.name!r} in {path}"
+                    )
+                    continue
+                names.add(dent.name)
+
+                child = self.image._read_inode(dent.blk, dent.offset)
+                child_path = os.path.join(path, os.fsdecode(dent.name))
+                if not child.is_symlink and os.path.islink(child_path):
+                    warnings.warn(
+                        f"Not writing through the existing symlink {child_path}"
+                    )
+                    continue
+
+                self._extract(child, child_path, executor)
+
+            return
+
+        if inode.hard_link_count > 1 and inode.inode_number in self.links:
+            if os.path.lexists(path):
+                os.unlink(path)
+            os.link(self.links[inode.inode_number], path)
+            return
+
+        if inode.is_file:
+            self._extract_file(inode, path, executor)
+        elif inode.is_symlink:
+            if os.path.lexists(path):
+                os.unlink(path)
+            os.symlink(os.fsdecode(inode.target_path), path)
+        elif inode.is_fifo:
+            os.mkfifo(path, inode.permissions)
+        elif inode.is_socket:
+            os.mknod(path, stat.S_IFSOCK | inode.permissions)
+        elif inode.is_block_dev or inode.is_char_dev:
+            mode = stat.S_IFBLK if inode.is_block_dev else stat.S_IFCHR
+            try:
+                os.mknod(
+                    path,
+                    mode | inode.permissions,
+                    os.makedev(inode.major, inode.minor),
+                )
+            except PermissionError:
+                warnings.warn(f"Insufficient privileges to create device {path}")
+                return
+        else:
+            raise SquashError(f"Cannot extract inode type {inode.inode_type}")
+
+        self.files.append((path, inode))
+        if inode.hard_link_count > 1:
+            self.links[inode.inode_number] = path
+
+    def _extract_file(
+        self, inode: "Inode", path: str, executor: ThreadPoolExecutor
+    ) -> None:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_NOFOLLOW, 0o600)
+        try:
+            os.ftruncate(fd, inode.file_size)
+        finally:
+            os.close(fd)
+
+        chunk_size = CHUNK_BLKS * self.image.sblk.blk_size
+        for start in range(0, inode.file_size, chunk_size):
+            self._drain(4 * self.workers)
+            self.pending.add(
+                executor.submit(self._write_chunk, inode, path, start, chunk_size)
+            )
+
+    def _write_chunk(self, inode: "Inode", path: str, start: int, size: int) -> None:
+        f = File(self.image, inode)
+        end = min(start + size, inode.file_size)
+        buffer = bytearray(self.image.sblk.blk_size)
+
+        fd = os.open(path, os.O_WRONLY | _O_NOFOLLOW)
+        try:
+            offset = start
+            while offset < end:
+                # Holes are left unwritten as the file was truncated to its size
+                try:
+                    offset = f.seek(offset, SEEK_DATA)
+                except OSError:
+                    break
+                hole = min(f.seek(offset, SEEK_HOLE), end)
+
+                f.seek(offset)
+                while offset < hole:
+                    view = memoryview(buffer)[: min(len(buffer), hole - offset)]
+                    n = f.readinto(view)
+                    if n == 0:
+                        raise ReadError("Unexpected end of file data")
+                    os.pwrite(fd, view[:n], offset)
+                    offset += n
+        finally:
+            os.close(fd)
+
+    def _drain(self, limit: int) -> None:
+        """Wait until at most ``limit`` chunks are in flight, re-raising the
+        first error raised by a worker."""
+        while len(self.pending) > limit:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+
+    def _restore_metadata(self, path: str, inode: "Inode") -> None:
+        info = Info(self.image, inode)
+
+        if self.chown:
+            os.lchown(path, info.uid, info.gid)
+
+        if not inode.is_symlink:
+            os.chmod(path, inode.permissions)
+
+        if hasattr(os, "setxattr"):
+            for name, value in info.xattrs.items():
+                try:
+                    os.setxattr(path, name, value, follow_symlinks=False)
+                except OSError as e:
+                    warnings.warn(f"Failed to set xattr {name!r} on {path}: {e}")
+
+        os.utime(
+            path,
+            (inode.modified_time, inode.modified_time),
+            follow_symlinks=False,
+        )
@@ -0,0 +1,223 @@
+import errno
+import io
+import os
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Sequence, TYPE_CHECKING
+
+from .arrays import block_offsets, HAVE_NUMPY, NUMPY_MIN_SIZE
+from .common import ReadError
+
+# Not defined by the os module on every platform
+SEEK_DATA = getattr(os, "SEEK_DATA", 3)
+SEEK_HOLE = getattr(os, "SEEK_HOLE", 4)
+
+if TYPE_CHECKING:
+    from _typeshed import WriteableBuffer
+
+    from .image import Image
+    from .inode import Inode
+
+
+class File(io.RawIOBase):
+    """Seekable, read-only raw stream over the contents of a regular file.
+
+    Only the data blocks (and the fragment) covering the requested range are
+    decompressed. Wrap it in an ``io.BufferedReader`` for efficient small
+    reads, as ``Image.open`` does.
+
+    Sparse blocks (stored as size 0) read as zeros without touching the image,
+    and ``seek`` supports ``SEEK_DATA`` and ``SEEK_HOLE`` to skip over them.
+    """
+
+    def __init__(self, image: "Image", inode: "Inode") -> None:
+        super().__init__()
+        self.image = image
+        self.inode = inode
+        self.size = inode.file_size
+        self.blk_size = image.sblk.blk_size
+        self.pos = 0
+
+        # On-disk offset of each data block (prefix sums over blk_sizes)
+        self.blk_offsets: Sequence[int] = []
+        if image.index is not None:
+            self.blk_offsets = image.index.block_offsets(inode)
+        elif HAVE_NUMPY and len(inode.blk_sizes) >= NUMPY_MIN_SIZE:
+            self.blk_offsets = block_offsets(inode.blks_start, inode.blk_sizes).tolist()
+        else:
+            blk_offsets = []
+            offset = inode.blks_start
+            for size in inode.blk_sizes:
+                blk_offsets.append(offset)
+                offset += size & ~(1 << 24)
+            self.blk_offsets = blk_offsets
+
+        # Most recently decompressed block, to serve small sequential reads
+        self._blk_idx = -1
+        self._blk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        elif whence == SEEK_DATA or whence == SEEK_HOLE:
+            pos = self._seek_sparse(offset, whence == SEEK_DATA)
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+
+        self.pos = pos
+
+        return self.pos
+
+    def is_hole(self, idx: int) -> bool:
+        """Whether data block ``idx`` is a sparse (all-zero) block."""
+        return idx < len(self.blk_offsets) and self.inode.blk_sizes[idx] == 0
+
+    def _seek_sparse(self, offset: int, data: bool) -> int:
+        """Return the first position at or after ``offset`` that is in a data
+        region (``data``) or in a hole. The end of the file counts as a hole."""
+        if not 0 <= offset < self.size:
+            raise OSError(errno.ENXIO, os.strerror(errno.ENXIO))
+
+        idx = offset // self.blk_size
+        while self.is_hole(idx) == data:
+            idx += 1
+            offset = idx * self.blk_size
+
+            if offset >= self.size:
+                if data:
+                    raise OSError(errno.ENXIO, os.strerror(errno.ENXIO))
+                return self.size
+
+        return offset
+
+    def readinto(self, b: "WriteableBuffer") -> int:
+        view = memoryview(b).cast("B")
+        total = 0
+        self._prefetch(len(view))
+
+        if self.image.workers > 1:
+            total = self._readinto_parallel(view)
+
+        while total < len(view) and self.pos < self.size:
+            idx = self.pos // self.blk_size
+            blk = self._read_blk(idx)
+            start = self.pos - idx * self.blk_size
+            n = min(len(view) - total, len(blk) - start, self.size - self.pos)
+            if n <= 0:
+                raise ReadError("Unexpected end of file data")
+
+            view[total : total + n] = blk[start : start + n]
+            total += n
+            self.pos += n
+
+        return total
+
+    def _readinto_parallel(self, view: memoryview) -> int:
+        """Decompress the data blocks fully covered by ``view`` on the image's
+        thread pool and copy them into ``view`` in order."""
+        first = -(-self.pos // self.blk_size)
+        last = min(self.pos + len(view), self.size) // self.blk_size
+        last = min(last, len(self.blk_offsets))
+
+        if last - first < 2:
+            return 0
+
+        # Bytes before the first block boundary are read serially
+        total = 0
+        if self.pos < first * self.blk_size:
+            total = self.readinto(view[: first * self.blk_size - self.pos])
+
+        executor = self.image._get_executor()
+        # Bound the number of decompressed blocks held in memory at once
+        window = 2 * self.image.workers
+        futures: Deque["Future[memoryview]"] = deque()
+
+        idx = first
+        while idx < last or futures:
+            if idx < last and len(futures) < window:
+                futures.append(executor.submit(self._load_blk, idx))
+                idx += 1
+                continue
+
+            blk = futures.popleft().result()
+            if len(blk) != self.blk_size:
+                raise ReadError("Unexpected data block size")
+
+            view[total : total + len(blk)] = blk
+            total += len(blk)
+            self.pos += len(blk)
+
+        return total
+
+    def readview(self, size: int = -1) -> memoryview:
+        """Read up to ``size`` bytes, stopping at the end of the current block,
+        and return them as a read-only view. Blocks stored uncompressed are
+        returned as a view into the image itself, without any copy."""
+        if self.pos >= self.size or size == 0:
+            return memoryview(b"")
+
+        idx = self.pos // self.blk_size
+        blk = self._read_blk(idx)
+        start = self.pos - idx * self.blk_size
+        end = min(len(blk), start + self.size - self.pos)
+        if size >= 0:
+            end = min(end, start + size)
+        if end <= start:
+            raise ReadError("Unexpected end of file data")
+
+        self.pos += end - start
+
+        return blk[start:end]
+
+    def readall(self) -> bytes:
+        buffer = bytearray(max(self.size - self.pos, 0))
+        n = self.readinto(buffer)
+        del buffer[n:]
+
+        return bytes(buffer)
+
+    def _prefetch(self, size: int) -> None:
+        """Let the image source fetch the data blocks covering the next
+        ``size`` bytes with a single request."""
+        first = self.pos // self.blk_size
+        last = min(self.pos + size, self.size) // self.blk_size
+        last = min(last, len(self.blk_offsets) - 1)
+
+        if last > first and self.image.source is not None:
+            start = self.blk_offsets[first]
+            end = self.blk_offsets[last] + (self.inode.blk_sizes[last] & ~(1 << 24))
+            self.image.source.prefetch(start, end - start)
+
+    def _read_blk(self, idx: int) -> memoryview:
+        if idx != self._blk_idx:
+            self._blk = self._load_blk(idx)
+            self._blk_idx = idx
+
+        return self._blk
+
+    def _load_blk(self, idx: int) -> memoryview:
+        if idx < len(self.blk_offsets):
+            return self.image._read_data_blk(
+                self.blk_offsets[idx], self.inode.blk_sizes[idx]
+            )
+
+        return self.image._read_tail(self.inode)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(size={self.size}, pos={self.pos})"
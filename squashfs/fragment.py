@@ -1,15 +1,21 @@
+import struct
+from typing import Union
+
 from .common import Mixin, ReadError
 
+_FRAGMENT_BLOCK_ENTRY = struct.Struct("<QII")
+
 
 class FragmentBlockEntry(Mixin):
+    __slots__ = ("start", "size", "is_compressed")
+
     def __init__(self) -> None:
         self.start = 0
         self.size = 0
         self.is_compressed = False
 
     def read(self, mm: memoryview, offset: int) -> int:
-        self.start, offset = self._read_uint64(mm, offset)
-        self.size, offset = self._read_uint32(mm, offset)
+        self.start, self.size, _ = _FRAGMENT_BLOCK_ENTRY.unpack_from(mm, offset)
 
         if self.size & (1 << 24):
             self.is_compressed = False
@@ -20,9 +26,41 @@ class FragmentBlockEntry(Mixin):
         if self.size > (1 << 20):
             raise ReadError("Fragment size is too large")
 
-        offset += 4
+        return offset + _FRAGMENT_BLOCK_ENTRY.size
+
+    def pack(self) -> bytes:
+        size = self.size if self.is_compressed else self.size | (1 << 24)
 
-        return offset
+        return _FRAGMENT_BLOCK_ENTRY.pack(self.start, size, 0)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(start={self.start}, size={self.size})"
+
+
+class FragmentTable(Mixin):
+    """The decompressed fragment table. Entries are decoded when accessed, so
+    loading a table with millions of fragments does not create millions of
+    objects."""
+
+    __slots__ = ("buffer", "count")
+
+    def __init__(
+        self, buffer: "Union[bytes, memoryview]" = b"", count: int = 0
+    ) -> None:
+        if len(buffer) < count * _FRAGMENT_BLOCK_ENTRY.size:
+            raise ReadError("Fragment table is truncated")
+
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx: int) -> FragmentBlockEntry:
+        if not 0 <= idx < self.count:
+            raise KeyError(idx)
+
+        entry = FragmentBlockEntry()
+        entry.read(memoryview(self.buffer), idx * _FRAGMENT_BLOCK_ENTRY.size)
+
+        return entry
@@ -1,105 +1,291 @@
-from io import IOBase
-import zlib
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter
+import warnings
+from io import BufferedReader
 from math import ceil
-import mmap
-from typing import cast, Dict, List, Optional, Tuple
-
-from .common import Mixin, FileNotFoundError, NotAFileError, ReadError
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .common import (
+    Mixin,
+    FileNotFoundError,
+    NotADirectoryError,
+    NotAFileError,
+    ReadError,
+    SquashError,
+)
 from .superblock import Superblock
 from .info import Info
-from .fragment import FragmentBlockEntry
+from .file import File
+from .extract import Extractor
+from .verify import BlockError, Checker
+from .fragment import FragmentTable
+from .arrays import decode_uint32
 from .inode import Inode
-from .dentry import DirectoryEntry
+from .dentry import DirEntry, DirectoryEntry
+from .metadata import METADATA_SIZE, MetadataTable
+from .compressor import get_compressor
+from .cache import LRUCache
+from .xattr import XattrTable
+from .source import open_source, Source
+from .index import SidecarIndex
+from .stats import Hook, Stats
+
+# count, start (metadata block of the inodes) and inode_number
+_DIRECTORY_HEADER = struct.Struct("<III")
 
 
 class Image(Mixin):
-    def __init__(self, file: str) -> None:
-        self.fp: Optional[IOBase] = open(file, "rb")
-        mm = mmap.mmap(cast(IOBase, self.fp).fileno(), 0, prot=mmap.PROT_READ)
-        self.mm = memoryview(mm)
+    """A SquashFS image.
+
+    ``file`` is a path (memory-mapped), a file descriptor (read with
+    ``pread``), a seekable binary file-like object, or a ``Source``, e.g. a
+    ``ChunkedSource`` over a ``RangeSource`` for remote storage.
+
+    ``index`` is the path of a sidecar index written by
+    ``squashfs.index.build_index``. Tables and paths are then read from the
+    index instead of being decoded. An index that does not match the image is
+    ignored with a warning.
+
+    With ``stats``, decompression, inode parsing and directory lookups are
+    counted and timed; see ``stats`` and ``add_hook``.
+
+    An image can be shared by any number of threads. Tables read at open are
+    never modified afterwards, and the metadata, inode, path and block caches
+    are locked LRU caches in which concurrent misses on the same entry are
+    loaded once. File objects returned by ``open`` keep their own position
+    and must not be shared between threads, and the image must not be closed
+    while other threads use it.
+    """
+
+    def __init__(
+        self,
+        file: Any,
+        lazy: bool = False,
+        metadata_cache_size: int = 8 << 20,
+        block_cache_size: int = 32 << 20,
+        workers: int = 1,
+        path_cache_size: int = 4096,
+        inode_cache_size: int = 4096,
+        xattr_cache_size: int = 1024,
+        index: Optional[str] = None,
+        stats: bool = False,
+    ) -> None:
+        # Counters and histograms, or None when instrumentation is disabled
+        self.statistics: Optional[Stats] = Stats() if stats else None
+        self.source: Optional[Source] = open_source(file)
+        # Sources passed in by the caller are not closed with the image
+        self._owns_source = self.source is not file
+        # on-disk offset -> decompressed data block or fragment block
+        self.block_cache: LRUCache[int, bytes] = LRUCache(block_cache_size)
+        # Number of threads used to decompress the data blocks of a single read
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = Lock()
+        # normalized path -> inode reference, or -1 if the path does not exist
+        self.path_cache: LRUCache[str, int] = LRUCache(path_cache_size, lambda _: 1)
+        # export table block index -> decompressed block of inode references
+        self.export_cache: LRUCache[int, bytes] = LRUCache(metadata_cache_size)
+        # (metadata block, offset) -> parsed inode
+        self.inode_cache: LRUCache[Tuple[int, int], Inode] = LRUCache(
+            inode_cache_size, lambda _: 1
+        )
         # UID/GID table idx -> UID/GID
-        self.ids: Dict[int, int] = {}
-        self.inode_table: memoryview = memoryview(b"")
-        # offset from inode_table_start -> offset from the head of inode_table
-        self.inode_table_index: Dict[int, int] = {}
-        self.directory_table: memoryview = memoryview(b"")
-        # offset from directory_table_start ->  offset from the head of directory_table
-        self.directory_table_index: Dict[int, int] = {}
-        self.fragments: Dict[int, FragmentBlockEntry] = {}
-        self.xattrs: Dict[int, Dict[bytes, bytes]] = {}
+        self.ids: List[int] = []
+        self.fragments = FragmentTable()
         self.sblk = Superblock()
 
-        self.sblk.read(self.mm, 0)
-        self._read_id_table()
-        self._decompress_inode_table()
-        self._decompress_directory_table()
-        if not self.sblk.flags & 0x0010:
-            self._read_fragment_table()
-        if not self.sblk.flags & 0x0200:
-            self._read_xattr_table()
+        offset = self.sblk.read(self._read(0, 96), 0)
+        self.compressor = get_compressor(self.sblk.compression_id)
+        # Compressor options are stored in a metadata block after the superblock
+        if self.sblk.flags & 0x0400:
+            options, _ = self._decompress_blk(offset)
+            self.compressor.read_options(memoryview(options), 0)
+        self.index = self._open_index(index) if index is not None else None
+        if self.index is not None:
+            self.ids = list(self.index.ids)
+            self.inode_table = self.index.metadata_table(
+                self,
+                b"inodes",
+                self.sblk.inode_table_start,
+                self.sblk.directory_table_start,
+            )
+            self.directory_table = self.index.metadata_table(
+                self,
+                b"dirs",
+                self.sblk.directory_table_start,
+                self.sblk.fragment_table_start,
+            )
+            self.fragments = FragmentTable(
+                self.index.fragments, self.sblk.fragment_entry_count
+            )
+        else:
+            self._read_id_table()
+            # In lazy mode, metadata blocks are only decompressed when an inode
+            # or a directory listing stored in them is read
+            self.inode_table = MetadataTable(
+                self,
+                self.sblk.inode_table_start,
+                self.sblk.directory_table_start,
+                lazy,
+                metadata_cache_size,
+            )
+            self.directory_table = MetadataTable(
+                self,
+                self.sblk.directory_table_start,
+                self.sblk.fragment_table_start,
+                lazy,
+                metadata_cache_size,
+            )
+            if not self.sblk.flags & 0x0010:
+                self._read_fragment_table()
+        # xattrs are only decoded when accessed
+        self.xattrs = XattrTable(self, xattr_cache_size, metadata_cache_size)
         blk = (self.sblk.root_inode_ref >> 16) & 0xFFFFFFFF
         offset = self.sblk.root_inode_ref & 0xFFFF
         self.root_inode = self._read_inode(blk, offset)
+        self._zero_blk = memoryview(bytes(self.sblk.blk_size))
 
     def get_inode(self, path: str) -> Inode:
-        inode = self.root_inode
+        ref = self._resolve("/".join(p for p in path.split("/") if p))
 
-        for p in path.split("/"):
-            if not p:
-                continue
+        if ref < 0:
+            raise FileNotFoundError
 
-            found = False
-            dentries = self._read_dentries(inode)
-            for dent in dentries:
-                if p == dent.name.decode():
-                    inode = self._read_inode(dent.blk, dent.offset)
-                    found = True
-                    break
+        return self._read_inode((ref >> 16) & 0xFFFFFFFF, ref & 0xFFFF)
 
-            if not found:
-                raise FileNotFoundError
+    def inode_by_number(self, inode_number: int) -> Inode:
+        """Look up an inode by its number using the export table."""
+        ref = self._read_export_entry(inode_number)
+
+        return self._read_inode((ref >> 16) & 0xFFFFFFFF, ref & 0xFFFF)
+
+    def parent(self, inode: Inode) -> Inode:
+        """Return the parent of a directory. The root is its own parent."""
+        if not inode.is_dir:
+            raise NotADirectoryError
+
+        # The parent inode number of the root is inode_count + 1
+        if inode.parent_inode_number > self.sblk.inode_count:
+            return self.root_inode
+
+        return self.inode_by_number(inode.parent_inode_number)
 
-        return inode
+    def hard_links(self, top: str = "") -> Dict[int, List[str]]:
+        """Group the paths under ``top`` that share an inode number. Only inode
+        numbers with more than one path are returned."""
+        top = "/".join(p for p in top.split("/") if p)
+        paths: Dict[int, List[str]] = {}
+        stack = [(top, self.get_inode(top))]
 
-    def open(self, path: str) -> bytes:
+        while stack:
+            path, inode = stack.pop()
+            for entry in self._scandir(path, inode):
+                if entry.is_dir():
+                    stack.append((entry.path, entry.inode()))
+                else:
+                    paths.setdefault(entry.inode_number, []).append(entry.path)
+
+        return {n: p for n, p in paths.items() if len(p) > 1}
+
+    def open(self, path: str) -> BufferedReader:
+        return BufferedReader(self.open_raw(path), self.sblk.blk_size)
+
+    def open_raw(self, path: str) -> File:
+        """Open a file without buffering, e.g. to use ``File.readview``."""
         inode = self.get_inode(path)
 
         if not inode.is_file:
             raise NotAFileError
 
-        buffer = b""
-        offset = inode.blks_start
+        return File(self, inode)
 
-        for size in inode.blk_sizes:
-            if size & (1 << 24):
-                size = size ^ (1 << 24)
-                blk = self.mm[offset : offset + size].tobytes()
-            else:
-                blk = zlib.decompress(self.mm[offset : offset + size])
-
-            buffer += blk
-            offset += size
-
-        # File contains a fragment
-        frag_idx = inode.fragment_blk_index
-        if frag_idx != 0xFFFFFFFF:
-            start = self.fragments[frag_idx].start
-            size = self.fragments[frag_idx].size
-            if self.fragments[frag_idx].is_compressed:
-                fragment = zlib.decompress(self.mm[start : start + size])
-            else:
-                fragment = self.mm[start : start + size].tobytes()
+    def extract(self, src: str = "", dest: str = ".", workers: int = 1) -> None:
+        """Extract ``src`` (a directory or any other file) to ``dest``,
+        restoring permissions, mtimes and xattrs (and ownership when running
+        as root). File contents are written by ``workers`` threads."""
+        Extractor(self, workers).extract(src, dest)
 
-            frag_offset = inode.blk_offset
-            frag_size = inode.file_size % self.sblk.blk_size
-            buffer += fragment[frag_offset : frag_offset + frag_size]
+    def verify(self, workers: int = 1) -> List[BlockError]:
+        """Check that every metadata, data and fragment block can be read and
+        decompressed to its expected size, and return the corrupt blocks.
+        Blocks are decompressed by ``workers`` threads in on-disk order.
 
-        return buffer
+        The image must be opened with ``lazy=True`` for corrupt inode and
+        directory tables to be reported: an eager image decompresses them
+        when it is opened, and fails with ``ReadError`` instead."""
+        checker = Checker(self, workers)
+        checker.check()
+
+        return checker.errors
+
+    def manifest(self, workers: int = 1) -> Dict[str, str]:
+        """Return the SHA-256 hex digest of every regular file by path, in
+        path order. Raise ``ReadError`` if any block is corrupt. As with
+        ``verify``, open the image with ``lazy=True``."""
+        checker = Checker(self, workers, digest=True)
+        checker.check()
+        if checker.errors:
+            raise ReadError(
+                f"{len(checker.errors)} corrupt blocks, first: {checker.errors[0]}"
+            )
+
+        return dict(sorted(checker.digests.items()))
 
     def listdir(self, path: str = "") -> List[str]:
-        return [
-            dent.name.decode() for dent in self._read_dentries(self.get_inode(path))
-        ]
+        return [entry.name for entry in self.scandir(path)]
+
+    def scandir(self, path: str = "") -> Iterator[DirEntry]:
+        """Iterate over the entries of a directory without reading their
+        inodes."""
+        path = "/".join(p for p in path.split("/") if p)
+
+        return self._scandir(path, self.get_inode(path))
+
+    def walk(
+        self, top: str = "", topdown: bool = True
+    ) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Generate (dirpath, dirnames, filenames) tuples like ``os.walk``.
+
+        Only the inodes of directories are read, and subdirectories are
+        reached through their directory entries rather than by path."""
+        top = "/".join(p for p in top.split("/") if p)
+
+        return self._walk(top, self.get_inode(top), topdown)
+
+    def _scandir(self, path: str, inode: Inode) -> Iterator[DirEntry]:
+        if not inode.is_dir:
+            raise NotADirectoryError
+
+        for dent in self._iter_dentries(
+            inode.blk_idx, inode.blk_offset, inode.file_size - 3
+        ):
+            yield DirEntry(self, path, dent)
+
+    def _walk(
+        self, top: str, inode: Inode, topdown: bool
+    ) -> Iterator[Tuple[str, List[str], List[str]]]:
+        dirs = []
+        nondirs = []
+        for entry in self._scandir(top, inode):
+            if entry.is_dir():
+                dirs.append(entry)
+            else:
+                nondirs.append(entry.name)
+
+        dirnames = [entry.name for entry in dirs]
+        if topdown:
+            yield top, dirnames, nondirs
+
+        # Skip directories removed from dirnames by the caller
+        remaining = set(dirnames)
+        for entry in dirs:
+            if entry.name in remaining:
+                yield from self._walk(entry.path, entry.inode(), topdown)
+
+        if not topdown:
+            yield top, dirnames, nondirs
 
     def stat(self, path: str) -> Info:
         inode = self.get_inode(path)
@@ -108,192 +294,331 @@ class Image(Mixin):
         return info
 
     def _read_dentries(self, inode: Inode) -> List[DirectoryEntry]:
-        dentries = []
-        start = self.directory_table_index[inode.blk_idx] + inode.blk_offset
-        end = start + inode.file_size - 3
+        return list(
+            self._iter_dentries(inode.blk_idx, inode.blk_offset, inode.file_size - 3)
+        )
+
+    def _iter_dentries(
+        self, blk: int, offset: int, size: int
+    ) -> Iterator[DirectoryEntry]:
+        directory_table, start = self.directory_table.read(blk, offset, size)
+        end = start + size
 
         while start < end:
-            count, start = self._read_uint32(self.directory_table, start)
-            inode_blk, start = self._read_uint32(self.directory_table, start)
-            inode_no, start = self._read_uint32(self.directory_table, start)
+            count, inode_blk, inode_no = _DIRECTORY_HEADER.unpack_from(
+                directory_table, start
+            )
+            start += _DIRECTORY_HEADER.size
 
             if count >= 256:
                 raise ReadError("Too many directory entries")
 
             for _ in range(count + 1):
                 dent = DirectoryEntry()
-                start = dent.read(self.directory_table, start)
+                start = dent.read(directory_table, start)
                 dent.blk = inode_blk
                 dent.inode = inode_no + dent.inode_offset
-                dentries.append(dent)
-
-        return dentries
-
-    def _read_inode(self, blk: int, offset: int) -> Inode:
-        inode = Inode(self.sblk)
-        inode.read(self.inode_table, self.inode_table_index[blk] + offset)
+                yield dent
+
+    def _resolve(self, path: str) -> int:
+        """Return the inode reference of a normalized path, or -1 if the path
+        does not exist. Results for the path and each of its prefixes are kept
+        in the path cache."""
+        if not path:
+            return self.sblk.root_inode_ref
+
+        if self.index is not None:
+            return self.index.lookup(path)
+
+        ref = self.path_cache.get(path)
+
+        if ref is None:
+            parent, _, name = path.rpartition("/")
+            parent_ref = self._resolve(parent)
+            ref = -1
+
+            if parent_ref >= 0:
+                inode = self._read_inode(
+                    (parent_ref >> 16) & 0xFFFFFFFF, parent_ref & 0xFFFF
+                )
+                if inode.is_dir:
+                    start = perf_counter()
+                    dent = self._lookup(inode, name.encode())
+                    if dent is not None:
+                        ref = (dent.blk << 16) | dent.offset
+                    if self.statistics is not None:
+                        self.statistics.record(
+                            "lookup.directory", start, perf_counter() - start
+                        )
+
+            if ref < 0 and self.statistics is not None:
+                self.statistics.count("lookup.not_found")
+            self.path_cache.put(path, ref)
+
+        return ref
+
+    def _lookup(self, inode: Inode, name: bytes) -> Optional[DirectoryEntry]:
+        """Find the entry called ``name`` in a directory.
+
+        Entries are sorted by name. For extended directories, the directory
+        index is binary searched to find the metadata block holding ``name``
+        so that only that part of the listing is scanned.
+        """
+        blk, offset = inode.blk_idx, inode.blk_offset
+        pos, end = 0, inode.file_size - 3
+        index = inode.index
+
+        # Find the first index entry whose name is greater than name
+        lo, hi = 0, len(index)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if index[mid].name <= name:
+                lo = mid + 1
+            else:
+                hi = mid
 
-        return inode
+        if lo > 0:
+            pos = index[lo - 1].index
+            blk = index[lo - 1].start
+            offset = (inode.blk_offset + pos) % METADATA_SIZE
+        if lo < len(index):
+            end = index[lo].index
 
-    def _decompress_inode_table(self) -> None:
-        start = self.sblk.inode_table_start
-        end = self.sblk.directory_table_start
-        inode_table = b""
-        offset = 0
+        for dent in self._iter_dentries(blk, offset, end - pos):
+            if dent.name == name:
+                return dent
+            if dent.name > name:
+                break
 
-        while start < end:
-            offset2 = start - self.sblk.inode_table_start
-            self.inode_table_index[offset2] = offset
-            blk, start = self._decompress_blk(start)
-            inode_table += blk
-            offset += len(blk)
+        return None
 
-        self.inode_table = memoryview(inode_table)
+    def _read_inode(self, blk: int, offset: int) -> Inode:
+        def load() -> Inode:
+            start = perf_counter()
+            inode = Inode(self.sblk)
+            self.inode_table.read_struct(blk, offset, inode.read)
+            if self.statistics is not None:
+                self.statistics.record("inode.parse", start, perf_counter() - start)
+            return inode
+
+        return self.inode_cache.get_or_load((blk, offset), load)
+
+    def _read_export_entry(self, inode_number: int) -> int:
+        if self.index is not None:
+            if not 1 <= inode_number <= self.sblk.inode_count:
+                raise FileNotFoundError
+            return int(self.index.export[inode_number - 1])
 
-    def _read_id_table(self) -> None:
-        offset = self.sblk.id_table_start
-        buffer = b""
+        if (
+            not self.sblk.flags & 0x0080
+            or self.sblk.export_table_start == 0xFFFFFFFFFFFFFFFF
+        ):
+            raise SquashError("Image has no export table")
 
-        for _ in range(ceil(self.sblk.id_count / 2048)):
-            offset2, offset = self._read_uint64(self.mm, offset)
+        if not 1 <= inode_number <= self.sblk.inode_count:
+            raise FileNotFoundError
 
-            blk, _ = self._decompress_blk(offset2)
-            buffer += blk
+        # Each metadata block of the export table holds 1024 inode references
+        blk_idx, offset = divmod((inode_number - 1) * 8, METADATA_SIZE)
 
-        offset = 0
-        for i in range(self.sblk.id_count):
-            self.ids[i], offset = self._read_uint32(memoryview(buffer), offset)
+        def load() -> bytes:
+            start, _ = self._read_uint64(
+                self._read(self.sblk.export_table_start + 8 * blk_idx, 8), 0
+            )
+            blk, _ = self._decompress_blk(start)
+            return blk
 
-    def _decompress_directory_table(self) -> None:
-        start = self.sblk.directory_table_start
-        end = self.sblk.fragment_table_start
-        directory_table = b""
-        offset = 0
+        blk = self.export_cache.get_or_load(blk_idx, load)
+        ref, _ = self._read_uint64(memoryview(blk), offset)
 
-        while start < end:
-            offset2 = start - self.sblk.directory_table_start
-            self.directory_table_index[offset2] = offset
-            blk, start = self._decompress_blk(start)
-            directory_table += blk
-            offset += len(blk)
+        return ref
 
-        self.directory_table = memoryview(directory_table)
+    def _read_id_table(self) -> None:
+        buffer = self._read_table(self.sblk.id_table_start, 4 * self.sblk.id_count)
+        self.ids = decode_uint32(buffer, self.sblk.id_count)
 
     def _read_fragment_table(self) -> None:
-        offset = self.sblk.fragment_table_start
-        buffer = b""
+        count = self.sblk.fragment_entry_count
+        buffer = self._read_table(self.sblk.fragment_table_start, 16 * count)
+        self.fragments = FragmentTable(buffer, count)
 
-        for _ in range(ceil(self.sblk.fragment_entry_count / 512)):
-            offset2, offset = self._read_uint64(self.mm, offset)
-
-            blk, _ = self._decompress_blk(offset2)
-            buffer += blk
-
-        offset = 0
-        for i in range(self.sblk.fragment_entry_count):
-            entry = FragmentBlockEntry()
-            offset = entry.read(memoryview(buffer), offset)
-
-            self.fragments[i] = entry
-
-    def _read_xattr_table(self) -> None:
-        if self.sblk.xattr_id_table_start == 0xFFFFFFFFFFFFFFFF:
-            return
+    def _read_table(self, offset: int, size: int) -> bytes:
+        """Read a table of ``size`` bytes stored in metadata blocks whose
+        locations are listed at ``offset``."""
+        count = ceil(size / METADATA_SIZE)
+        locations = self._read(offset, 8 * count)
+        blks = []
 
-        offset = self.sblk.xattr_id_table_start
-        # holds the decompressed xattr lookup table
-        buffer = b""
+        for i in range(count):
+            offset2, _ = self._read_uint64(locations, 8 * i)
 
-        # Parse the xattr ID table and decompress the xattr lookup table
-        xattr_table_start, offset = self._read_uint64(self.mm, offset)
-
-        xattr_ids, offset = self._read_uint32(self.mm, offset)
-        _, offset = self._read_uint32(self.mm, offset)
-
-        start = xattr_table_start
-        end, _ = self._read_uint64(self.mm, offset)
-
-        for _ in range(ceil(xattr_ids / 512)):
-            offset2, offset = self._read_uint64(self.mm, offset)
-            block, _ = self._decompress_blk(offset2)
-            buffer += block
-
-        xattr_lookup_table = memoryview(buffer)
-
-        offset = 0
-        buffer2 = b""
-        # starting pos of block -> offset in decompressed buffer
-        xattr_table_index = {}
-        while start < end:
-            xattr_table_index[start - xattr_table_start] = offset
-            block, start = self._decompress_blk(start)
-            buffer2 += block
-            offset += len(block)
-
-        xattr_table = memoryview(buffer2)
-
-        # Parse the loopkup table and KV entries
-        # TODO Add a class for loopkup table entries?
-        offset = 0
-        for i in range(xattr_ids):
-            xattr_ref, offset = self._read_uint64(xattr_lookup_table, offset)
-            count, offset = self._read_uint32(xattr_lookup_table, offset)
-            _, offset = self._read_uint32(xattr_lookup_table, offset)
-
-            blk = (xattr_ref >> 16) & 0xFFFFFFFF
-            offset2 = xattr_table_index[blk] + (xattr_ref & 0xFFFF)
-
-            self.xattrs[i] = {}
-
-            for _ in range(count):
-                typ, offset2 = self._read_uint16(xattr_table, offset2)
-                name_size, offset2 = self._read_uint16(xattr_table, offset2)
-                name, offset2 = self._read_string(xattr_table, offset2, name_size)
-                value_size, offset2 = self._read_uint32(xattr_table, offset2)
-
-                # value is stored out of line
-                if typ & 0x0100:
-                    val, offset2 = self._read_uint64(xattr_table, offset2)
-                    value_blk = (val >> 16) & 0xFFFFFFFF
-                    value_offset = xattr_table_index[value_blk] + (val & 0xFFFF)
-
-                    value_size, value_offset = self._read_uint32(
-                        xattr_table, value_offset
-                    )
-                    value = xattr_table[
-                        value_offset : value_offset + value_size
-                    ].tobytes()
-                else:
-                    value, offset2 = self._read_string(xattr_table, offset2, value_size)
-
-                if typ & 0xFF == 0:
-                    name = b"user." + name
-                elif typ & 0xFF == 1:
-                    name = b"trusted." + name
-                elif typ & 0xFF == 2:
-                    name = b"security." + name
-                else:
-                    raise ReadError("Unknown xattr prefix type")
-
-                self.xattrs[i][name] = value
+            blk, _ = self._decompress_blk(offset2)
+            blks.append(blk)
+
+        return b"".join(blks)
+
+    def _read_data_blk(self, offset: int, size: int) -> memoryview:
+        """Return a data block. Blocks stored uncompressed are returned as a
+        view into the image without copying."""
+        # Sparse block
+        if size == 0:
+            return self._zero_blk
+
+        if size & (1 << 24):
+            return self._read(offset, size ^ (1 << 24))
+
+        return memoryview(
+            self.block_cache.get_or_load(
+                offset,
+                lambda: self._decompress(
+                    "decompress.data", self._read(offset, size), self.sblk.blk_size
+                ),
+            )
+        )
+
+    def _read_fragment(self, idx: int) -> memoryview:
+        entry = self.fragments[idx]
+        start = entry.start
+        size = entry.size
+
+        if entry.is_compressed:
+            return memoryview(
+                self.block_cache.get_or_load(
+                    start,
+                    lambda: self._decompress(
+                        "decompress.fragment",
+                        self._read(start, size),
+                        self.sblk.blk_size,
+                    ),
+                )
+            )
+
+        return self._read(start, size)
+
+    def _read_tail(self, inode: Inode) -> memoryview:
+        """Return the tail end of a file stored in a fragment block."""
+        if inode.fragment_blk_index == 0xFFFFFFFF:
+            return memoryview(b"")
+
+        fragment = self._read_fragment(inode.fragment_blk_index)
+        frag_offset = inode.blk_offset
+        frag_size = inode.file_size % self.sblk.blk_size
+
+        return fragment[frag_offset : frag_offset + frag_size]
 
     def _decompress_blk(self, offset: int) -> Tuple[bytes, int]:
-        header, offset = self._read_uint16(self.mm, offset)
+        # Read the header and the largest possible block in one request
+        buffer = self._read(offset, 2 + METADATA_SIZE)
+        header, pos = self._read_uint16(buffer, 0)
         data_size = header & 0x7FFF
         is_compressed = not header & 0x8000
 
-        data, offset = self._read_string(self.mm, offset, data_size)
+        data, pos = self._read_string(buffer, pos, data_size)
         if is_compressed:
-            data = zlib.decompress(data)
-
-        return data, offset
+            data = self._decompress("decompress.metadata", data, METADATA_SIZE)
+
+        return data, offset + pos
+
+    def _decompress(self, name: str, data: Any, max_size: int) -> bytes:
+        start = perf_counter() if self.statistics is not None else 0.0
+        try:
+            result = self.compressor.decompress(data, max_size)
+        except Exception as e:
+            # Each codec raises its own exception type on corrupt input
+            raise ReadError(f"Failed to decompress block: {e}") from e
+
+        if self.statistics is not None:
+            self.statistics.record(name, start, perf_counter() - start, len(result))
+
+        return result
+
+    def _read(self, offset: int, size: int) -> memoryview:
+        """Read raw bytes of the image. The result is shorter than ``size``
+        only at the end of the image."""
+        if self.source is None:
+            raise ValueError("I/O operation on closed image")
+
+        return self.source.read(offset, size)
+
+    def add_hook(self, hook: Hook) -> None:
+        """Call ``hook(name, start, seconds, size)`` after each timed
+        operation. Enables instrumentation if it is disabled."""
+        if self.statistics is None:
+            self.statistics = Stats()
+
+        self.statistics.hooks.append(hook)
+
+    def remove_hook(self, hook: Hook) -> None:
+        if self.statistics is not None:
+            self.statistics.hooks.remove(hook)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the operation counters and histograms (if
+        instrumentation is enabled) and of the cache and I/O statistics,
+        which are always maintained."""
+        snapshot: Dict[str, Any] = {"codec": self.compressor.name}
+        if self.statistics is not None:
+            snapshot.update(self.statistics.snapshot())
+
+        caches: Dict[str, LRUCache[Any, Any]] = {
+            "block": self.block_cache,
+            "path": self.path_cache,
+            "inode": self.inode_cache,
+            "export": self.export_cache,
+            "inode_table": self.inode_table.cache,
+            "directory_table": self.directory_table.cache,
+            "xattr": self.xattrs.cache,
+        }
+        snapshot["caches"] = {
+            name: {
+                "hits": cache.hits,
+                "misses": cache.misses,
+                "evictions": cache.evictions,
+                "size": cache.size,
+                "capacity": cache.capacity,
+            }
+            for name, cache in caches.items()
+        }
+
+        if self.source is not None:
+            snapshot["source"] = {
+                "requests": self.source.requests,
+                "bytes_read": self.source.bytes_read,
+            }
+
+        return snapshot
+
+    def _open_index(self, path: str) -> Optional[SidecarIndex]:
+        try:
+            index = SidecarIndex(path)
+        except (OSError, SquashError) as e:
+            warnings.warn(f"Ignoring sidecar index {path}: {e}")
+            return None
+
+        if not index.matches(self.sblk):
+            warnings.warn(f"Ignoring sidecar index {path}: built for another image")
+            return None
+
+        return index
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+
+            return self._executor
 
     def close(self) -> None:
-        if self.fp is None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        if self.source is None:
             return
 
-        self.fp.close()
-        self.fp = None
+        if self._owns_source:
+            self.source.close()
+        self.source = None
 
     def __enter__(self):  # type: ignore
         return self
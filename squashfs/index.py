@@ -0,0 +1,263 @@
+"""Persistent sidecar index of an image.
+
+The index holds everything ``Image`` otherwise decodes at open or on first
+use: the decompressed inode and directory tables, the ID, fragment and
+export tables, the path to inode reference map and the on-disk offsets of
+the data blocks of every file. It is laid out as little-endian arrays that
+are used in place through ``mmap``, so processes opening the same image
+share one copy through the page cache.
+
+>>> with Image("image.sfs") as image:
+...     build_index(image, "image.sfs.idx")
+>>> image = Image("image.sfs", index="image.sfs.idx")
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, List, Sequence, Tuple, TYPE_CHECKING
+
+from .common import SquashError
+from .metadata import MetadataTable
+
+if TYPE_CHECKING:
+    from .image import Image
+    from .inode import Inode
+    from .superblock import Superblock
+
+MAGIC = b"SQFSIDX\0"
+VERSION = 1
+
+# magic, version, section count, and the superblock fields the index is
+# validated against: bytes_used, modification_time, inode_count and
+# root_inode_ref
+_HEADER = struct.Struct("<8sIIQIIQ")
+# name, offset and size of a section
+_SECTION = struct.Struct("<8sQQ")
+
+# Decompressed metadata tables and the sections holding their block indexes
+_TABLES = [(b"inodes", b"inoidx"), (b"dirs", b"diridx")]
+
+# Marks inodes that are not regular files in the block offset table
+_NO_BLOCKS = 0xFFFFFFFFFFFFFFFF
+
+
+class SidecarIndex:
+    """A memory-mapped sidecar index. Use ``matches`` to check that it was
+    built for a given image."""
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise SquashError(
+                "Sidecar indexes are only supported on little-endian hosts"
+            )
+
+        with open(path, "rb") as f:
+            # mmap refuses empty files
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise SquashError("Sidecar index is truncated")
+            self.mm = memoryview(mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ))
+
+        try:
+            (
+                magic,
+                version,
+                count,
+                self.bytes_used,
+                self.modification_time,
+                self.inode_count,
+                self.root_inode_ref,
+            ) = _HEADER.unpack_from(self.mm, 0)
+        except struct.error:
+            raise SquashError("Sidecar index is truncated")
+
+        if magic != MAGIC or version != VERSION:
+            raise SquashError("Not a sidecar index of a supported version")
+
+        if len(self.mm) < _HEADER.size + count * _SECTION.size:
+            raise SquashError("Sidecar index is truncated")
+
+        # section name -> contents
+        self.sections: Dict[bytes, memoryview] = {}
+        for i in range(count):
+            name, offset, size = _SECTION.unpack_from(
+                self.mm, _HEADER.size + i * _SECTION.size
+            )
+            if offset + size > len(self.mm):
+                raise SquashError("Sidecar index is truncated")
+            if offset % 8:
+                raise SquashError(f"Sidecar index section {name!r} is misaligned")
+            self.sections[name.rstrip(b"\0")] = self.mm[offset : offset + size]
+
+        self.ids = self._section(b"ids", "I")
+        self.fragments = self._section(b"frags")
+        self.export = self._section(b"export", "Q")
+        self.path_offsets = self._section(b"pathoff", "Q")
+        self.paths = self._section(b"paths")
+        self.path_refs = self._section(b"pathref", "Q")
+        self.file_blocks = self._section(b"fileblk", "Q")
+        self.blk_offsets = self._section(b"blkoffs", "Q")
+        self.tables = {
+            name: (self._section(name), self._section(index_name, "Q"))
+            for name, index_name in _TABLES
+        }
+
+    def _section(self, name: bytes, fmt: str = "B") -> memoryview:
+        """Return a section as an array of ``fmt`` items."""
+        section = self.sections.get(name)
+        if section is None:
+            raise SquashError(f"Sidecar index lacks section {name!r}")
+        if len(section) % struct.calcsize(fmt):
+            raise SquashError(f"Sidecar index section {name!r} is truncated")
+
+        if fmt == "B":
+            return section
+
+        return section.cast(fmt)  # type: ignore[call-overload, no-any-return]
+
+    def matches(self, sblk: "Superblock") -> bool:
+        """Whether the index was built from the image with this superblock."""
+        return bool(
+            self.bytes_used == sblk.bytes_used
+            and self.modification_time == sblk.modification_time
+            and self.inode_count == sblk.inode_count
+            and self.root_inode_ref == sblk.root_inode_ref
+        )
+
+    def metadata_table(
+        self, image: "Image", name: bytes, start: int, end: int
+    ) -> MetadataTable:
+        """Return the inode (``b"inodes"``) or directory (``b"dirs"``) table
+        backed by the index."""
+        buffer, blks = self.tables[name]
+        index = {blks[i]: blks[i + 1] for i in range(0, len(blks), 2)}
+
+        return MetadataTable.preloaded(image, start, end, buffer, index)
+
+    def lookup(self, path: str) -> int:
+        """Return the inode reference of a normalized path, or -1."""
+        key = path.encode()
+        offsets = self.path_offsets
+        lo, hi = 0, len(self.path_refs)
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.paths[offsets[mid] : offsets[mid + 1]].tobytes() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if (
+            lo < len(self.path_refs)
+            and self.paths[offsets[lo] : offsets[lo + 1]] == key
+        ):
+            return int(self.path_refs[lo])
+
+        return -1
+
+    def block_offsets(self, inode: "Inode") -> Sequence[int]:
+        """Return the on-disk offsets of the data blocks of a file."""
+        start = self.file_blocks[inode.inode_number - 1]
+        if start == _NO_BLOCKS:
+            raise SquashError("Inode is not a regular file")
+
+        return self.blk_offsets[start : start + len(inode.blk_sizes)]
+
+
+def build_index(image: "Image", path: str) -> None:
+    """Write a sidecar index of ``image`` to ``path``. The file is replaced
+    atomically, so processes never see a partially written index."""
+    if sys.byteorder != "little":
+        raise SquashError("Sidecar indexes are only supported on little-endian hosts")
+
+    sblk = image.sblk
+    sections: List[Tuple[bytes, bytes]] = []
+
+    sections.append((b"ids", array("I", image.ids).tobytes()))
+    sections.append((b"frags", bytes(image.fragments.buffer)))
+
+    bounds = [
+        (sblk.inode_table_start, sblk.directory_table_start),
+        (sblk.directory_table_start, sblk.fragment_table_start),
+    ]
+    for (name, index_name), (start, end) in zip(_TABLES, bounds):
+        table = MetadataTable(image, start, end)
+        blks = array("Q")
+        for item in sorted(table.index.items()):
+            blks.extend(item)
+        sections.append((name, bytes(table.buffer)))
+        sections.append((index_name, blks.tobytes()))
+
+    # Walk the tree for the path map, the export table and the block offsets
+    export = array("Q", bytes(8 * sblk.inode_count))
+    file_blocks = array("Q", [_NO_BLOCKS]) * sblk.inode_count
+    blk_offsets = array("Q")
+    paths: List[Tuple[bytes, int]] = []
+
+    export[image.root_inode.inode_number - 1] = sblk.root_inode_ref
+    stack = [("", image.root_inode)]
+    while stack:
+        top, inode = stack.pop()
+        for entry in image._scandir(top, inode):
+            paths.append((entry.path.encode(), entry.inode_ref))
+            export[entry.inode_number - 1] = entry.inode_ref
+
+            child = entry.inode()
+            if child.is_dir:
+                stack.append((entry.path, child))
+            elif child.is_file and file_blocks[child.inode_number - 1] == _NO_BLOCKS:
+                file_blocks[child.inode_number - 1] = len(blk_offsets)
+                offset = child.blks_start
+                for size in child.blk_sizes:
+                    blk_offsets.append(offset)
+                    offset += size & ~(1 << 24)
+
+    paths.sort()
+    path_offsets = array("Q", [0])
+    for name, _ in paths:
+        path_offsets.append(path_offsets[-1] + len(name))
+
+    sections.append((b"export", export.tobytes()))
+    sections.append((b"pathoff", path_offsets.tobytes()))
+    sections.append((b"paths", b"".join(name for name, _ in paths)))
+    sections.append((b"pathref", array("Q", [ref for _, ref in paths]).tobytes()))
+    sections.append((b"fileblk", file_blocks.tobytes()))
+    sections.append((b"blkoffs", blk_offsets.tobytes()))
+
+    _write(path, sblk, sections)
+
+
+def _write(path: str, sblk: "Superblock", sections: List[Tuple[bytes, bytes]]) -> None:
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(sections),
+        sblk.bytes_used,
+        sblk.modification_time,
+        sblk.inode_count,
+        sblk.root_inode_ref,
+    )
+
+    # Sections are 8-byte aligned so that they can be cast to uint64 arrays
+    offset = _HEADER.size + len(sections) * _SECTION.size
+    table = []
+    for name, data in sections:
+        offset += -offset % 8
+        table.append(_SECTION.pack(name, offset, len(data)))
+        offset += len(data)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header + b"".join(table))
+            for name, data in sections:
+                f.write(bytes(-f.tell() % 8))
+                f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
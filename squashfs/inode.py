@@ -1,8 +1,11 @@
+import struct
+import sys
+from array import array
 from enum import Enum
 from math import ceil
 from typing import List
 
-from .common import Mixin, SquashError
+from .common import Mixin, ReadError, SquashError
 from .dentry import DirectoryIndex
 from .superblock import Superblock
 
@@ -24,7 +27,46 @@ class InodeType(Enum):
     EX_SOCKET = 14
 
 
+# Every inode starts with a header of type, permissions, uid_idx, gid_idx,
+# modified_time and inode_number, followed by a type-specific body
+_TYPE = struct.Struct("<H")
+_DIRECTORY = struct.Struct("<HHHHIIIIHHI")
+_FILE = struct.Struct("<HHHHIIIIII")
+_SYMLINK = struct.Struct("<HHHHIIII")
+_DEVICE = struct.Struct("<HHHHIIII")
+_IPC = struct.Struct("<HHHHIII")
+_EX_DIRECTORY = struct.Struct("<HHHHIIIIIIHHI")
+_EX_FILE = struct.Struct("<HHHHIIQQQIIII")
+_EX_DEVICE = struct.Struct("<HHHHIIIII")
+_EX_IPC = struct.Struct("<HHHHIIII")
+
+
 class Inode(Mixin):
+    __slots__ = (
+        "sblk",
+        "inode_type",
+        "permissions",
+        "uid_idx",
+        "gid_idx",
+        "modified_time",
+        "inode_number",
+        "blk_idx",
+        "hard_link_count",
+        "file_size",
+        "blk_offset",
+        "parent_inode_number",
+        "index_count",
+        "index",
+        "blks_start",
+        "fragment_blk_index",
+        "sparse",
+        "blk_sizes",
+        "target_size",
+        "target_path",
+        "device",
+        "xattr_idx",
+    )
+
     def __init__(self, sblk: Superblock) -> None:
         self.sblk = sblk
 
@@ -40,12 +82,14 @@ class Inode(Mixin):
         self.file_size = 0
         self.blk_offset = 0
         self.parent_inode_number = 0
+        self.index_count = 0
+        self.index: List[DirectoryIndex] = []
 
         self.blks_start = 0
         self.fragment_blk_index = 0
-        self.blk_offset = 0
-        self.file_size = 0
-        self.blk_sizes: List[int] = []
+        self.sparse = 0
+        # Kept as a compact array of uint32 rather than a list of ints
+        self.blk_sizes: "array[int]" = array("I")
 
         self.target_size = 0
         self.target_path = b""
@@ -102,88 +146,122 @@ class Inode(Mixin):
             or self.inode_type == InodeType.EX_SOCKET.value
         )
 
+    @property
+    def major(self) -> int:
+        return (self.device >> 8) & 0xFFF
+
+    @property
+    def minor(self) -> int:
+        return (self.device & 0xFF) | ((self.device >> 12) & 0xFFF00)
+
     def read(self, mm: memoryview, offset: int) -> int:
-        self.inode_type, offset = self._read_uint16(mm, offset)
-        self.permissions, offset = self._read_uint16(mm, offset)
-        self.uid_idx, offset = self._read_uint16(mm, offset)
-        self.gid_idx, offset = self._read_uint16(mm, offset)
-        self.modified_time, offset = self._read_uint32(mm, offset)
-        self.inode_number, offset = self._read_uint32(mm, offset)
+        (self.inode_type,) = _TYPE.unpack_from(mm, offset)
 
         # Basic directory
         if self.inode_type == InodeType.DIRECTORY.value:
-            self.blk_idx, offset = self._read_uint32(mm, offset)
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.file_size, offset = self._read_uint16(mm, offset)
-            self.blk_offset, offset = self._read_uint16(mm, offset)
-            self.parent_inode_number, offset = self._read_uint32(mm, offset)
-
-            return offset
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.blk_idx,
+                self.hard_link_count,
+                self.file_size,
+                self.blk_offset,
+                self.parent_inode_number,
+            ) = _DIRECTORY.unpack_from(mm, offset)
+
+            return offset + _DIRECTORY.size
 
         # Basic file
         elif self.inode_type == InodeType.FILE.value:
-            self.blks_start, offset = self._read_uint32(mm, offset)
-            self.fragment_blk_index, offset = self._read_uint32(mm, offset)
-            self.blk_offset, offset = self._read_uint32(mm, offset)
-            self.file_size, offset = self._read_uint32(mm, offset)
-
-            self.blk_sizes = []
-
-            # File does not end with a fragment
-            if self.fragment_blk_index == 0xFFFFFFFF:
-                num_blks = ceil(self.file_size / self.sblk.blk_size)
-            else:
-                num_blks = self.file_size // self.sblk.blk_size
-
-            for _ in range(num_blks):
-                size, offset = self._read_uint32(mm, offset)
-                self.blk_sizes.append(size)
-
-            return offset
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.blks_start,
+                self.fragment_blk_index,
+                self.blk_offset,
+                self.file_size,
+            ) = _FILE.unpack_from(mm, offset)
+
+            return self._read_blk_sizes(mm, offset + _FILE.size)
 
         # Basic symlink
         elif self.inode_type == InodeType.SYMLINK.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.target_size, offset = self._read_uint32(mm, offset)
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.target_size,
+            ) = _SYMLINK.unpack_from(mm, offset)
+            offset += _SYMLINK.size
             self.target_path, offset = self._read_string(mm, offset, self.target_size)
 
             return offset
 
-        # Basic block device
-        elif self.inode_type == InodeType.BLOCK_DEVICE.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.device, offset = self._read_uint32(mm, offset)
-
-            return offset
-
-        # Basic char device
-        elif self.inode_type == InodeType.CHAR_DEVICE.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.device, offset = self._read_uint32(mm, offset)
-
-            return offset
-
-        # Basic fifo
-        elif self.inode_type == InodeType.FIFO.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-
-            return offset
-
-        # Basic socket
-        elif self.inode_type == InodeType.SOCKET.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-
-            return offset
+        # Basic block device and char device
+        elif (
+            self.inode_type == InodeType.BLOCK_DEVICE.value
+            or self.inode_type == InodeType.CHAR_DEVICE.value
+        ):
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.device,
+            ) = _DEVICE.unpack_from(mm, offset)
+
+            return offset + _DEVICE.size
+
+        # Basic fifo and socket
+        elif (
+            self.inode_type == InodeType.FIFO.value
+            or self.inode_type == InodeType.SOCKET.value
+        ):
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+            ) = _IPC.unpack_from(mm, offset)
+
+            return offset + _IPC.size
 
         # Extended directory
         elif self.inode_type == InodeType.EX_DIRECTORY.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.file_size, offset = self._read_uint32(mm, offset)
-            self.blk_idx, offset = self._read_uint32(mm, offset)
-            self.parent_inode_number, offset = self._read_uint32(mm, offset)
-            self.index_count, offset = self._read_uint16(mm, offset)
-            self.blk_offset, offset = self._read_uint16(mm, offset)
-            self.xattr_idx, offset = self._read_uint32(mm, offset)
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.file_size,
+                self.blk_idx,
+                self.parent_inode_number,
+                self.index_count,
+                self.blk_offset,
+                self.xattr_idx,
+            ) = _EX_DIRECTORY.unpack_from(mm, offset)
+            offset += _EX_DIRECTORY.size
 
             self.index = []
 
@@ -196,67 +274,193 @@ class Inode(Mixin):
 
         # Extended file
         elif self.inode_type == InodeType.EX_FILE.value:
-            self.blks_start, offset = self._read_uint64(mm, offset)
-            self.file_size, offset = self._read_uint64(mm, offset)
-            self.sparse, offset = self._read_uint64(mm, offset)
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.fragment_blk_index, offset = self._read_uint32(mm, offset)
-            self.blk_offset, offset = self._read_uint32(mm, offset)
-            self.xattr_idx, offset = self._read_uint32(mm, offset)
-
-            # File does not end with a fragment
-            if self.fragment_blk_index == 0xFFFFFFFF:
-                num_blks = ceil(self.file_size / self.sblk.blk_size)
-            else:
-                num_blks = self.file_size // self.sblk.blk_size
-
-            self.blk_sizes = []
-
-            for _ in range(num_blks):
-                size, offset = self._read_uint32(mm, offset)
-                self.blk_sizes.append(size)
-
-            return offset
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.blks_start,
+                self.file_size,
+                self.sparse,
+                self.hard_link_count,
+                self.fragment_blk_index,
+                self.blk_offset,
+                self.xattr_idx,
+            ) = _EX_FILE.unpack_from(mm, offset)
+
+            return self._read_blk_sizes(mm, offset + _EX_FILE.size)
 
         # Extended symlink
         elif self.inode_type == InodeType.EX_SYMLINK.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.target_size, offset = self._read_uint32(mm, offset)
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.target_size,
+            ) = _SYMLINK.unpack_from(mm, offset)
+            offset += _SYMLINK.size
             self.target_path, offset = self._read_string(mm, offset, self.target_size)
             self.xattr_idx, offset = self._read_uint32(mm, offset)
 
             return offset
 
-        # Extended block device
-        elif self.inode_type == InodeType.EX_BLOCK_DEVICE.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.device, offset = self._read_uint32(mm, offset)
-            self.xatttr_idx, offset = self._read_uint32(mm, offset)
+        # Extended block device and char device
+        elif (
+            self.inode_type == InodeType.EX_BLOCK_DEVICE.value
+            or self.inode_type == InodeType.EX_CHAR_DEVICE.value
+        ):
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.device,
+                self.xattr_idx,
+            ) = _EX_DEVICE.unpack_from(mm, offset)
+
+            return offset + _EX_DEVICE.size
+
+        # Extended fifo and socket
+        elif (
+            self.inode_type == InodeType.EX_FIFO.value
+            or self.inode_type == InodeType.EX_SOCKET.value
+        ):
+            (
+                _,
+                self.permissions,
+                self.uid_idx,
+                self.gid_idx,
+                self.modified_time,
+                self.inode_number,
+                self.hard_link_count,
+                self.xattr_idx,
+            ) = _EX_IPC.unpack_from(mm, offset)
+
+            return offset + _EX_IPC.size
 
-            return offset
+        # Unknown inode type
+        else:
+            raise SquashError(f"Unknown inode type {self.inode_type}")
 
-        # Extended char device
-        elif self.inode_type == InodeType.EX_CHAR_DEVICE.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.device, offset = self._read_uint32(mm, offset)
-            self.xatttr_idx, offset = self._read_uint32(mm, offset)
+    def pack(self) -> bytes:
+        """Serialize the inode; the inverse of ``read``."""
+        header = (
+            self.inode_type,
+            self.permissions,
+            self.uid_idx,
+            self.gid_idx,
+            self.modified_time,
+            self.inode_number,
+        )
 
-            return offset
+        if self.inode_type == InodeType.DIRECTORY.value:
+            return _DIRECTORY.pack(
+                *header,
+                self.blk_idx,
+                self.hard_link_count,
+                self.file_size,
+                self.blk_offset,
+                self.parent_inode_number,
+            )
 
-        # Extended fifo
-        elif self.inode_type == InodeType.EX_FIFO.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.xatttr_idx, offset = self._read_uint32(mm, offset)
+        elif self.inode_type == InodeType.FILE.value:
+            return _FILE.pack(
+                *header,
+                self.blks_start,
+                self.fragment_blk_index,
+                self.blk_offset,
+                self.file_size,
+            ) + struct.pack(f"<{len(self.blk_sizes)}I", *self.blk_sizes)
 
-            return offset
+        elif self.inode_type == InodeType.SYMLINK.value:
+            return (
+                _SYMLINK.pack(*header, self.hard_link_count, len(self.target_path))
+                + self.target_path
+            )
 
-        # Extended socket
-        elif self.inode_type == InodeType.EX_BLOCK_DEVICE.value:
-            self.hard_link_count, offset = self._read_uint32(mm, offset)
-            self.xatttr_idx, offset = self._read_uint32(mm, offset)
+        elif (
+            self.inode_type == InodeType.BLOCK_DEVICE.value
+            or self.inode_type == InodeType.CHAR_DEVICE.value
+        ):
+            return _DEVICE.pack(*header, self.hard_link_count, self.device)
 
-            return offset
+        elif (
+            self.inode_type == InodeType.FIFO.value
+            or self.inode_type == InodeType.SOCKET.value
+        ):
+            return _IPC.pack(*header, self.hard_link_count)
+
+        elif self.inode_type == InodeType.EX_DIRECTORY.value:
+            return _EX_DIRECTORY.pack(
+                *header,
+                self.hard_link_count,
+                self.file_size,
+                self.blk_idx,
+                self.parent_inode_number,
+                len(self.index),
+                self.blk_offset,
+                self.xattr_idx,
+            ) + b"".join(dindex.pack() for dindex in self.index)
+
+        elif self.inode_type == InodeType.EX_FILE.value:
+            return _EX_FILE.pack(
+                *header,
+                self.blks_start,
+                self.file_size,
+                self.sparse,
+                self.hard_link_count,
+                self.fragment_blk_index,
+                self.blk_offset,
+                self.xattr_idx,
+            ) + struct.pack(f"<{len(self.blk_sizes)}I", *self.blk_sizes)
+
+        elif self.inode_type == InodeType.EX_SYMLINK.value:
+            return (
+                _SYMLINK.pack(*header, self.hard_link_count, len(self.target_path))
+                + self.target_path
+                + struct.pack("<I", self.xattr_idx)
+            )
+
+        elif (
+            self.inode_type == InodeType.EX_BLOCK_DEVICE.value
+            or self.inode_type == InodeType.EX_CHAR_DEVICE.value
+        ):
+            return _EX_DEVICE.pack(
+                *header, self.hard_link_count, self.device, self.xattr_idx
+            )
+
+        elif (
+            self.inode_type == InodeType.EX_FIFO.value
+            or self.inode_type == InodeType.EX_SOCKET.value
+        ):
+            return _EX_IPC.pack(*header, self.hard_link_count, self.xattr_idx)
 
-        # Unknown inode type
         else:
             raise SquashError(f"Unknown inode type {self.inode_type}")
+
+    def _read_blk_sizes(self, mm: memoryview, offset: int) -> int:
+        # File does not end with a fragment
+        if self.fragment_blk_index == 0xFFFFFFFF:
+            num_blks = ceil(self.file_size / self.sblk.blk_size)
+        else:
+            num_blks = self.file_size // self.sblk.blk_size
+
+        end = offset + 4 * num_blks
+        if end > len(mm):
+            raise ReadError("Unexpected end of buffer")
+
+        self.blk_sizes = array("I")
+        self.blk_sizes.frombytes(mm[offset:end])
+        if sys.byteorder == "big":
+            self.blk_sizes.byteswap()
+
+        return end
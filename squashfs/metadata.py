@@ -0,0 +1,127 @@
+import struct
+from typing import Callable, Dict, List, Tuple, TYPE_CHECKING
+
+from .cache import LRUCache
+from .common import Mixin, ReadError
+
+if TYPE_CHECKING:
+    from .image import Image
+
+# Size of an uncompressed metadata block
+METADATA_SIZE = 8192
+
+
+class MetadataTable(Mixin):
+    """A table stored as a sequence of metadata blocks (inode table, directory
+    table, ...) and addressed by (block offset from ``start``, offset within
+    the block).
+
+    In eager mode the whole table is inflated up front. In lazy mode blocks
+    are decompressed on demand and kept in an LRU cache bounded by
+    ``cache_size`` bytes.
+    """
+
+    def __init__(
+        self,
+        image: "Image",
+        start: int,
+        end: int,
+        lazy: bool = False,
+        cache_size: int = 8 << 20,
+    ) -> None:
+        self.image = image
+        self.start = start
+        self.end = end
+        self.lazy = lazy
+        # offset from start -> offset from the head of buffer (eager mode)
+        self.index: Dict[int, int] = {}
+        self.buffer: memoryview = memoryview(b"")
+        # offset from start -> (decompressed block, offset of next block)
+        self.cache: LRUCache[int, Tuple[bytes, int]] = LRUCache(
+            cache_size, lambda entry: len(entry[0])
+        )
+
+        if not lazy:
+            self._decompress_all()
+
+    @classmethod
+    def preloaded(
+        cls,
+        image: "Image",
+        start: int,
+        end: int,
+        buffer: memoryview,
+        index: Dict[int, int],
+    ) -> "MetadataTable":
+        """Create an eager table from an already decompressed ``buffer``, e.g.
+        one stored in a sidecar index."""
+        table = cls(image, start, end, lazy=True, cache_size=0)
+        table.lazy = False
+        table.buffer = buffer
+        table.index = index
+
+        return table
+
+    def read(self, blk: int, offset: int, size: int = 0) -> Tuple[memoryview, int]:
+        """Return a buffer and a position within it such that at least ``size``
+        bytes starting at (``blk``, ``offset``) are available, unless the end of
+        the table is reached first."""
+        if not self.lazy:
+            return self.buffer, self.index[blk] + offset
+
+        data, next_blk = self._read_blk(blk)
+        if offset + size <= len(data):
+            return memoryview(data), offset
+
+        # The requested range spans multiple metadata blocks
+        blks = [data]
+        available = len(data)
+        while available < offset + size and self.start + next_blk < self.end:
+            data, next_blk = self._read_blk(next_blk)
+            blks.append(data)
+            available += len(data)
+
+        return memoryview(b"".join(blks)), offset
+
+    def read_struct(
+        self, blk: int, offset: int, reader: Callable[[memoryview, int], int]
+    ) -> int:
+        """Call ``reader`` with a buffer covering (``blk``, ``offset``), growing
+        the buffer one metadata block at a time until it stops running off the
+        end. Used for variable-sized records such as inodes."""
+        size = 0
+
+        while True:
+            buffer, pos = self.read(blk, offset, size)
+            try:
+                return reader(buffer, pos)
+            except (struct.error, ReadError):
+                if not self.lazy or len(buffer) - pos < size:
+                    raise
+                size = len(buffer) - pos + METADATA_SIZE
+
+    def _read_blk(self, blk: int) -> Tuple[bytes, int]:
+        if not 0 <= blk < self.end - self.start:
+            raise ReadError("Metadata reference out of range")
+
+        def load() -> Tuple[bytes, int]:
+            data, offset = self.image._decompress_blk(self.start + blk)
+            return data, offset - self.start
+
+        return self.cache.get_or_load(blk, load)
+
+    def _decompress_all(self) -> None:
+        start = self.start
+        blks: List[bytes] = []
+        offset = 0
+
+        if self.image.source is not None:
+            self.image.source.prefetch(self.start, self.end - self.start)
+
+        while start < self.end:
+            self.index[start - self.start] = offset
+            blk, start = self.image._decompress_blk(start)
+            blks.append(blk)
+            offset += len(blk)
+
+        self.buffer = memoryview(b"".join(blks))
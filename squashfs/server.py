@@ -0,0 +1,205 @@
+import email.utils
+import html
+import mimetypes
+import posixpath
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from .common import SquashError
+from .file import File
+from .image import Image
+from .inode import Inode
+
+# Upper bound on the size of a single write to the client
+CHUNK_SIZE = 1 << 20
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a ``Range`` header into a [start, end) pair. Return None if the
+    header should be ignored, which is the case for multiple ranges, and raise
+    ``ValueError`` if the range cannot be satisfied."""
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size
+    else:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None
+
+    if start >= size or start >= end:
+        raise ValueError(header)
+
+    return start, end
+
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    """Serves directory listings and file contents of ``server.image``.
+
+    Byte ranges are served by seeking the file, so only the data blocks (and
+    the fragment) covering the range are decompressed, and responses are
+    written block by block instead of being read into memory first."""
+
+    server: "ImageServer"
+
+    def do_GET(self) -> None:
+        self._serve(True)
+
+    def do_HEAD(self) -> None:
+        self._serve(False)
+
+    def _serve(self, body: bool) -> None:
+        url = urlsplit(self.path)
+        path = posixpath.normpath("/" + unquote(url.path).lstrip("/"))
+        image = self.server.image
+
+        try:
+            inode = image.get_inode(path)
+        except SquashError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        if inode.is_dir:
+            if not url.path.endswith("/"):
+                self._redirect(HTTPStatus.MOVED_PERMANENTLY, url.path + "/")
+            else:
+                self._send_listing(path, body)
+        elif inode.is_symlink:
+            target = posixpath.join(posixpath.dirname(path), inode.target_path.decode())
+            self._redirect(HTTPStatus.FOUND, quote(posixpath.normpath(target)))
+        elif inode.is_file:
+            self._send_file(path, inode, body)
+        else:
+            self.send_error(HTTPStatus.FORBIDDEN)
+
+    def _redirect(self, status: HTTPStatus, location: str) -> None:
+        self.send_response(status)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_listing(self, path: str, body: bool) -> None:
+        title = html.escape(path)
+        lines = [
+            "<!DOCTYPE html>",
+            f"<html><head><meta charset='utf-8'><title>{title}</title></head>",
+            f"<body><h1>{title}</h1><ul>",
+        ]
+        for entry in self.server.image.scandir(path):
+            name = entry.name + ("/" if entry.is_dir() else "")
+            lines.append(f"<li><a href='{quote(name)}'>{html.escape(name)}</a></li>")
+        lines.append("</ul></body></html>")
+        data = "\n".join(lines).encode()
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _send_file(self, path: str, inode: Inode, body: bool) -> None:
+        etag = self.server.etag(inode)
+        size = inode.file_size
+
+        if etag in self._parse_etags(self.headers.get("If-None-Match", "")):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, size
+        status = HTTPStatus.OK
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range is not None:
+                start, end = byte_range
+                status = HTTPStatus.PARTIAL_CONTENT
+
+        content_type, _ = mimetypes.guess_type(path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header(
+            "Last-Modified", email.utils.formatdate(inode.modified_time, usegmt=True)
+        )
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+
+        if not body:
+            return
+
+        f = File(self.server.image, inode)
+        f.seek(start)
+        while f.tell() < end:
+            # Uncompressed blocks are written straight from the image
+            self.wfile.write(f.readview(min(end - f.tell(), CHUNK_SIZE)))
+
+    def _parse_etags(self, header: str) -> Tuple[str, ...]:
+        return tuple(tag.strip() for tag in header.split(",") if tag.strip())
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ImageServer(ThreadingHTTPServer):
+    """HTTP server exposing the contents of an image.
+
+    >>> with Image("image.sfs") as image:
+    ...     ImageServer(image, ("127.0.0.1", 8000)).serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, image: Image, address: Tuple[str, int], quiet: bool = False
+    ) -> None:
+        super().__init__(address, ImageRequestHandler)
+        self.image = image
+        self.quiet = quiet
+
+    def etag(self, inode: Inode) -> str:
+        """Derive an entity tag from the inode metadata. The image modification
+        time is included so that tags do not collide across image versions."""
+        return (
+            f'"{self.image.sblk.modification_time:x}-{inode.inode_number:x}-'
+            f'{inode.modified_time:x}-{inode.file_size:x}"'
+        )
+
+
+def serve(file: str, host: str = "127.0.0.1", port: int = 8000, **kwargs: Any) -> None:
+    with Image(file, **kwargs) as image:
+        with ImageServer(image, (host, port)) as server:
+            print(f"Serving {file} on http://{host}:{server.server_address[1]}/")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
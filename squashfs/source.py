@@ -0,0 +1,219 @@
+import mmap
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional, Union
+
+from .cache import LRUCache
+from .common import ReadError
+
+
+class Source:
+    """Random access to the bytes of an image.
+
+    Subclasses implement ``_read``, which is called with a range clamped to
+    the end of the source. ``requests`` and ``bytes_read`` count the reads
+    from the source; for a source backed by storage, its round trips.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.requests = 0
+        self.bytes_read = 0
+
+    def read(self, offset: int, size: int) -> memoryview:
+        """Return up to ``size`` bytes starting at ``offset``. Fewer bytes are
+        returned only at the end of the source."""
+        size = max(min(size, self.size - offset), 0)
+        self.requests += 1
+        self.bytes_read += size
+
+        data = memoryview(self._read(offset, size))
+        if len(data) != size:
+            raise ReadError("Short read from source")
+
+        return data
+
+    def prefetch(self, offset: int, size: int) -> None:
+        """Hint that the range will be read soon. Sources with a high cost per
+        request use it to fetch the range with a single request."""
+
+    def close(self) -> None:
+        pass
+
+    def _read(self, offset: int, size: int) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(size={self.size}, requests={self.requests}, bytes_read={self.bytes_read})"
+
+
+class MmapSource(Source):
+    """Memory-mapped local file. Reads are views into the mapping, so
+    uncompressed blocks are never copied."""
+
+    def __init__(self, file: Union[str, "os.PathLike[str]", int]) -> None:
+        fd = file if isinstance(file, int) else os.open(file, os.O_RDONLY)
+        try:
+            self.mm = memoryview(mmap.mmap(fd, 0, prot=mmap.PROT_READ))
+        finally:
+            # The mapping stays valid after the file is closed
+            if not isinstance(file, int):
+                os.close(fd)
+        super().__init__(len(self.mm))
+
+    def _read(self, offset: int, size: int) -> memoryview:
+        return self.mm[offset : offset + size]
+
+
+class PreadSource(Source):
+    """Local file read with ``os.pread``, one system call per request."""
+
+    def __init__(self, file: Union[str, "os.PathLike[str]", int]) -> None:
+        self.fd = os.open(file, os.O_RDONLY) if not isinstance(file, int) else file
+        self.owns_fd = not isinstance(file, int)
+        super().__init__(os.fstat(self.fd).st_size)
+
+    def _read(self, offset: int, size: int) -> bytes:
+        return os.pread(self.fd, size, offset)
+
+    def close(self) -> None:
+        if self.owns_fd and self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FileObjectSource(Source):
+    """Seekable binary file-like object. Seeks and reads are serialized with
+    a lock so that the object can be shared by threads."""
+
+    def __init__(self, f: Any) -> None:
+        self.f = f
+        self.lock = threading.Lock()
+        super().__init__(f.seek(0, os.SEEK_END))
+
+    def _read(self, offset: int, size: int) -> bytes:
+        with self.lock:
+            self.f.seek(offset)
+            return bytes(self.f.read(size))
+
+
+class RangeSource(Source):
+    """Custom storage accessed through ``reader(offset, size)``, e.g. HTTP
+    range requests or an object store client."""
+
+    def __init__(self, reader: Callable[[int, int], bytes], size: int) -> None:
+        self.reader = reader
+        super().__init__(size)
+
+    def _read(self, offset: int, size: int) -> bytes:
+        return self.reader(offset, size)
+
+
+class LatencySource(Source):
+    """Adds a fixed delay to every request to ``source``. Stands in for remote
+    storage in tests and benchmarks."""
+
+    def __init__(self, source: Source, latency: float = 0.001) -> None:
+        self.source = source
+        self.latency = latency
+        super().__init__(source.size)
+
+    def _read(self, offset: int, size: int) -> memoryview:
+        time.sleep(self.latency)
+        return self.source.read(offset, size)
+
+    def close(self) -> None:
+        self.source.close()
+
+
+class ChunkedSource(Source):
+    """Caches ``source`` in aligned chunks of ``chunk_size`` bytes.
+
+    A read is widened to whole chunks, and the missing chunks it covers are
+    fetched with one request per run of adjacent chunks, so neighbouring
+    metadata and data blocks cost a single round trip. Chunks are kept in an
+    LRU cache bounded by ``cache_size`` bytes.
+    """
+
+    def __init__(
+        self, source: Source, chunk_size: int = 1 << 20, cache_size: int = 64 << 20
+    ) -> None:
+        super().__init__(source.size)
+        self.source = source
+        self.chunk_size = chunk_size
+        # chunk index -> contents
+        self.cache: LRUCache[int, bytes] = LRUCache(cache_size)
+
+    def read(self, offset: int, size: int) -> memoryview:
+        size = max(min(size, self.size - offset), 0)
+        self.requests += 1
+        self.bytes_read += size
+        if size == 0:
+            return memoryview(b"")
+
+        first = offset // self.chunk_size
+        last = (offset + size - 1) // self.chunk_size
+        chunks = self._load(first, last)
+        start = offset - first * self.chunk_size
+
+        if len(chunks) == 1:
+            return memoryview(chunks[0])[start : start + size]
+
+        return memoryview(b"".join(chunks))[start : start + size]
+
+    def prefetch(self, offset: int, size: int) -> None:
+        # Fetching more than the cache holds would evict the range itself
+        size = min(size, self.size - offset, self.cache.capacity // 2)
+        if size > 0:
+            self._load(
+                offset // self.chunk_size, (offset + size - 1) // self.chunk_size
+            )
+
+    def _load(self, first: int, last: int) -> List[bytes]:
+        chunks: List[Optional[bytes]] = [
+            self.cache.get(idx) for idx in range(first, last + 1)
+        ]
+
+        idx = first
+        while idx <= last:
+            if chunks[idx - first] is not None:
+                idx += 1
+                continue
+
+            # Fetch the run of missing chunks starting at idx in one request
+            end = idx
+            while end + 1 <= last and chunks[end + 1 - first] is None:
+                end += 1
+
+            offset = idx * self.chunk_size
+            data = self.source.read(offset, (end + 1 - idx) * self.chunk_size)
+
+            for i in range(idx, end + 1):
+                pos = (i - idx) * self.chunk_size
+                chunk = data[pos : pos + self.chunk_size].tobytes()
+                chunks[i - first] = chunk
+                self.cache.put(i, chunk)
+
+            idx = end + 1
+
+        return [chunk for chunk in chunks if chunk is not None]
+
+    def close(self) -> None:
+        self.cache.clear()
+        self.source.close()
+
+
+def open_source(file: Any) -> Source:
+    """Return a source for a path (memory-mapped), a file descriptor (read
+    with ``pread``), a binary file-like object or an existing source."""
+    if isinstance(file, Source):
+        return file
+    if isinstance(file, int):
+        return PreadSource(file)
+    if isinstance(file, (str, bytes, os.PathLike)):
+        return MmapSource(file)  # type: ignore[arg-type]
+    if hasattr(file, "read") and hasattr(file, "seek"):
+        return FileObjectSource(file)
+
+    raise TypeError(f"Cannot read an image from {type(file).__name__}")
@@ -0,0 +1,102 @@
+import threading
+from typing import Any, Callable, Dict, List
+
+# Called with the name of an operation, its start time (time.perf_counter),
+# its duration in seconds and the number of bytes it produced
+Hook = Callable[[str, float, float, int], None]
+
+
+class Histogram:
+    """Latency histogram with power-of-two microsecond buckets. Bucket ``i``
+    counts durations below ``2 ** i`` microseconds."""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: List[int] = []
+
+    def add(self, seconds: float) -> None:
+        idx = int(seconds * 1e6).bit_length()
+        if idx >= len(self.buckets):
+            self.buckets.extend([0] * (idx + 1 - len(self.buckets)))
+
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """Return an upper bound of the ``p``-th percentile in seconds."""
+        target = p / 100 * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(float(2**idx) / 1e6, self.max)
+
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "max_s": self.max,
+            "p50_s": self.percentile(50),
+            "p99_s": self.percentile(99),
+            "buckets_us": {2**idx: n for idx, n in enumerate(self.buckets) if n},
+        }
+
+
+class Stats:
+    """Counters and latency histograms of the operations of an image, and
+    hooks called after each timed operation.
+
+    Instrumentation is only active while an image has a ``Stats`` object
+    (``Image(..., stats=True)`` or ``Image.add_hook``); otherwise each
+    instrumented operation costs a single ``None`` check.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.hooks: List[Hook] = []
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name: str, start: float, seconds: float, size: int = 0) -> None:
+        """Record an operation that took ``seconds`` and produced ``size``
+        bytes."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            if size:
+                key = name + ".bytes"
+                self.counters[key] = self.counters.get(key, 0) + size
+
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+        for hook in self.hooks:
+            hook(name, start, seconds, size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: histogram.snapshot()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
@@ -1,5 +1,9 @@
+import struct
+
 from .common import Mixin, ReadError
 
+_SUPERBLOCK = struct.Struct("<IIIIIHHHHHHQQQQQQQQ")
+
 
 class Superblock(Mixin):
     def __init__(self) -> None:
@@ -55,5 +59,28 @@ class Superblock(Mixin):
 
         return offset
 
+    def pack(self) -> bytes:
+        return _SUPERBLOCK.pack(
+            self.magic,
+            self.inode_count,
+            self.modification_time,
+            self.blk_size,
+            self.fragment_entry_count,
+            self.compression_id,
+            self.blk_log,
+            self.flags,
+            self.id_count,
+            self.version_major,
+            self.version_minor,
+            self.root_inode_ref,
+            self.bytes_used,
+            self.id_table_start,
+            self.xattr_id_table_start,
+            self.inode_table_start,
+            self.directory_table_start,
+            self.fragment_table_start,
+            self.export_table_start,
+        )
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(inode_count={self.inode_count}, blk_size={self.blk_size}, flags=0x{self.flags:x})"
@@ -0,0 +1,382 @@
+import hashlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from math import ceil
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from .common import Mixin, ReadError
+from .metadata import METADATA_SIZE
+
+if TYPE_CHECKING:
+    from .image import Image
+    from .inode import Inode
+
+# A data block (on-disk offset and size field) or a fragment block (index)
+_Unit = Tuple[int, bool, Any]
+
+
+class BlockError:
+    """A block that cannot be read or decompressed, or whose contents do not
+    match what its inodes expect. ``kind`` is ``"metadata"``, ``"data"`` or
+    ``"fragment"`` and ``paths`` lists the files stored in the block (for
+    metadata blocks, the entries that could not be read)."""
+
+    __slots__ = ("kind", "offset", "paths", "message")
+
+    def __init__(self, kind: str, offset: int, paths: List[str], message: str) -> None:
+        self.kind = kind
+        self.offset = offset
+        self.paths = paths
+        self.message = message
+
+    def __str__(self) -> str:
+        paths = ", ".join(self.paths) or "-"
+        return f"{self.kind} block at {self.offset}: {self.message} ({paths})"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(kind={self.kind!r}, offset={self.offset}, paths={self.paths!r}, message={self.message!r})"
+
+
+class _FileState:
+    """Progress of a regular file whose blocks are being checked."""
+
+    __slots__ = ("inode", "paths", "hasher", "next", "ready", "tail", "failed", "done")
+
+    def __init__(self, inode: "Inode", path: str) -> None:
+        self.inode = inode
+        self.paths = [path]
+        self.hasher: Any = None
+        # Index of the next block to hash, and blocks that arrived early
+        self.next = 0
+        self.ready: Dict[int, memoryview] = {}
+        self.tail: Optional[bytes] = None
+        self.failed = False
+        self.done = False
+
+
+class Checker(Mixin):
+    """Checks that every metadata, data and fragment block of an image can be
+    read and decompressed to the expected size, and optionally computes the
+    SHA-256 of every regular file.
+
+    Data and fragment blocks are decompressed on a pool of ``workers`` threads
+    in on-disk order, with a bounded number in flight, so the image is read
+    sequentially. A block shared by several files (duplicates and hard links)
+    and a fragment block are decompressed once for all the files using them.
+    The results are ``errors`` and, with ``digest``, ``digests`` (path -> hex
+    digest, for the files without errors).
+    """
+
+    def __init__(self, image: "Image", workers: int = 1, digest: bool = False) -> None:
+        self.image = image
+        self.workers = workers
+        self.digest = digest
+        self.errors: List[BlockError] = []
+        self.digests: Dict[str, str] = {}
+        # Number of metadata, data and fragment blocks checked
+        self.blocks = {"metadata": 0, "data": 0, "fragment": 0}
+        # (offset, size field) of a data block or fragment index -> users
+        self.users: Dict[Any, List[Tuple[_FileState, int]]] = {}
+        # Offsets of the metadata blocks checked so far
+        self.checked: Set[int] = set()
+
+    def check(self) -> None:
+        image = self.image
+        sblk = image.sblk
+        self._check_metadata(sblk.inode_table_start, sblk.directory_table_start)
+        self._check_metadata(sblk.directory_table_start, sblk.fragment_table_start)
+        self._check_table(sblk.id_table_start, 4 * sblk.id_count)
+        if sblk.fragment_entry_count:
+            self._check_table(sblk.fragment_table_start, 16 * sblk.fragment_entry_count)
+        if sblk.export_table_start != 0xFFFFFFFFFFFFFFFF:
+            self._check_table(sblk.export_table_start, 8 * sblk.inode_count)
+        if image.xattrs.count:
+            self._check_metadata(image.xattrs.table.start, image.xattrs.table.end)
+            self._check_table(image.xattrs.lookup_start, 16 * image.xattrs.count)
+
+        files = self._scan_tree()
+        units = self._schedule(files)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending: Deque[Tuple[_Unit, "Future[memoryview]"]] = deque()
+            try:
+                for unit in units:
+                    if len(pending) >= 4 * self.workers:
+                        self._finish(*pending.popleft())
+
+                    _, is_fragment, key = unit
+                    fn = self._load_fragment if is_fragment else self._load_data
+                    pending.append((unit, executor.submit(fn, key)))
+
+                while pending:
+                    self._finish(*pending.popleft())
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+        # Files without blocks to wait for, e.g. empty or fully sparse ones
+        for state in files.values():
+            self._advance(state)
+
+    def _check_metadata(self, start: int, end: int) -> None:
+        """Check every block of the metadata table in [start, end)."""
+        offset = start
+        while 0 <= offset < end:
+            offset = self._check_blk(offset)
+
+    def _check_table(self, start: int, size: int) -> None:
+        """Check the blocks of a table of ``size`` bytes whose block locations
+        are listed at ``start`` (ID, fragment, export and xattr ID tables)."""
+        count = ceil(size / METADATA_SIZE)
+        locations = self.image._read(start, 8 * count)
+        if len(locations) < 8 * count:
+            self._error("metadata", start, [], "Block list is truncated")
+            return
+
+        for i in range(count):
+            offset, _ = self._read_uint64(locations, 8 * i)
+            self._check_blk(offset)
+
+    def _check_blk(self, offset: int) -> int:
+        """Decompress the metadata block at ``offset`` unless it was already
+        checked, and return the offset of the next block (-1 if unknown)."""
+        image = self.image
+        header = image._read(offset, 2)
+        if len(header) < 2:
+            self._error("metadata", offset, [], "Block is out of range")
+            return -1
+
+        size, _ = self._read_uint16(header, 0)
+        next_offset = offset + 2 + (size & 0x7FFF)
+        if offset in self.checked:
+            return next_offset
+        self.checked.add(offset)
+        self.blocks["metadata"] += 1
+
+        try:
+            data, _ = image._decompress_blk(offset)
+        except Exception as e:
+            self._error("metadata", offset, [], e)
+            return next_offset
+
+        if len(data) > METADATA_SIZE:
+            self._error("metadata", offset, [], f"Decompressed to {len(data)} bytes")
+
+        return next_offset
+
+    def _scan_tree(self) -> Dict[int, _FileState]:
+        """Read every directory and inode, and return the regular files by
+        inode number."""
+        image = self.image
+        sblk = image.sblk
+        files: Dict[int, _FileState] = {}
+        stack = [("", image.root_inode)]
+
+        while stack:
+            path, inode = stack.pop()
+            try:
+                entries = list(image._scandir(path, inode))
+            except Exception as e:
+                offset = sblk.directory_table_start + inode.blk_idx
+                self._error("metadata", offset, [path], e)
+                continue
+
+            for entry in entries:
+                state = files.get(entry.inode_number)
+                if state is not None:
+                    # Another hard link to a file that was already read
+                    state.paths.append(entry.path)
+                    continue
+
+                try:
+                    child = entry.inode()
+                except Exception as e:
+                    offset = sblk.inode_table_start + (entry.inode_ref >> 16)
+                    self._error("metadata", offset, [entry.path], e)
+                    continue
+
+                if child.is_dir:
+                    stack.append((entry.path, child))
+                elif child.is_file:
+                    files[entry.inode_number] = _FileState(child, entry.path)
+
+        return files
+
+    def _schedule(self, files: Dict[int, _FileState]) -> List[_Unit]:
+        """Register the users of every data and fragment block, and return the
+        blocks sorted by on-disk offset."""
+        image = self.image
+        units: List[_Unit] = []
+
+        for state in files.values():
+            inode = state.inode
+            offset = inode.blks_start
+            for idx, size in enumerate(inode.blk_sizes):
+                # Sparse blocks are not stored
+                if size == 0:
+                    continue
+
+                key = (offset, size)
+                users = self.users.get(key)
+                if users is None:
+                    users = self.users[key] = []
+                    units.append((offset, False, key))
+                users.append((state, idx))
+                offset += size & ~(1 << 24)
+
+            idx = inode.fragment_blk_index
+            if idx == 0xFFFFFFFF:
+                continue
+
+            try:
+                entry = image.fragments[idx]
+            except KeyError:
+                state.failed = True
+                self._error(
+                    "metadata",
+                    image.sblk.inode_table_start + inode.blk_idx,
+                    state.paths,
+                    f"Fragment index {idx} out of range",
+                )
+                continue
+
+            users = self.users.get(idx)
+            if users is None:
+                users = self.users[idx] = []
+                units.append((entry.start, True, idx))
+            users.append((state, -1))
+
+        units.sort(key=lambda unit: unit[0])
+
+        return units
+
+    def _load_data(self, key: Tuple[int, int]) -> memoryview:
+        offset, size = key
+        image = self.image
+
+        data = image._read(offset, size & ~(1 << 24))
+        if len(data) != size & ~(1 << 24):
+            raise ReadError("Block extends past the end of the image")
+        if size & (1 << 24):
+            return data
+
+        return memoryview(
+            image._decompress("decompress.data", data, image.sblk.blk_size)
+        )
+
+    def _load_fragment(self, idx: int) -> memoryview:
+        image = self.image
+        entry = image.fragments[idx]
+
+        data = image._read(entry.start, entry.size)
+        if len(data) != entry.size:
+            raise ReadError("Block extends past the end of the image")
+        if not entry.is_compressed:
+            return data
+
+        return memoryview(
+            image._decompress("decompress.fragment", data, image.sblk.blk_size)
+        )
+
+    def _finish(self, unit: _Unit, future: "Future[memoryview]") -> None:
+        offset, is_fragment, key = unit
+        kind = "fragment" if is_fragment else "data"
+        users = self.users.pop(key)
+        self.blocks[kind] += 1
+
+        try:
+            data = future.result()
+        except Exception as e:
+            self._fail(kind, offset, users, e)
+            return
+
+        if is_fragment and len(data) > self.image.sblk.blk_size:
+            self._fail(kind, offset, users, f"Decompressed to {len(data)} bytes")
+            return
+
+        for state, idx in users:
+            if state.failed:
+                continue
+
+            if is_fragment:
+                start = state.inode.blk_offset
+                size = state.inode.file_size % self.image.sblk.blk_size
+                if start + size > len(data):
+                    self._fail(kind, offset, [(state, idx)], "Tail end out of range")
+                    continue
+                if self.digest:
+                    state.tail = bytes(data[start : start + size])
+            else:
+                expected = self._expected_size(state.inode, idx)
+                if len(data) != expected:
+                    self._fail(
+                        kind,
+                        offset,
+                        [(state, idx)],
+                        f"Decompressed to {len(data)} bytes, expected {expected}",
+                    )
+                    continue
+                if self.digest:
+                    state.ready[idx] = data
+
+            self._advance(state)
+
+    def _advance(self, state: _FileState) -> None:
+        """Hash the blocks of a file that are available in file order, and
+        record its digest once the whole file has been hashed."""
+        if not self.digest or state.failed or state.done:
+            return
+
+        inode = state.inode
+        if state.hasher is None:
+            state.hasher = hashlib.sha256()
+
+        while state.next < len(inode.blk_sizes):
+            idx = state.next
+            if inode.blk_sizes[idx] == 0:
+                data = self.image._zero_blk[: self._expected_size(inode, idx)]
+            elif idx in state.ready:
+                data = state.ready.pop(idx)
+            else:
+                return
+            state.hasher.update(data)
+            state.next += 1
+
+        if inode.fragment_blk_index != 0xFFFFFFFF:
+            if state.tail is None:
+                return
+            state.hasher.update(state.tail)
+            state.tail = None
+
+        digest = state.hasher.hexdigest()
+        for path in state.paths:
+            self.digests[path] = digest
+        state.hasher = None
+        state.done = True
+
+    def _expected_size(self, inode: "Inode", idx: int) -> int:
+        blk_size = self.image.sblk.blk_size
+        if inode.fragment_blk_index != 0xFFFFFFFF:
+            return blk_size
+
+        return min(inode.file_size - idx * blk_size, blk_size)
+
+    def _fail(
+        self,
+        kind: str,
+        offset: int,
+        users: List[Tuple[_FileState, int]],
+        error: Any,
+    ) -> None:
+        paths = []
+        for state, _ in users:
+            state.failed = True
+            state.ready.clear()
+            state.tail = None
+            paths.extend(state.paths)
+
+        self._error(kind, offset, paths, error)
+
+    def _error(self, kind: str, offset: int, paths: List[str], error: Any) -> None:
+        message = str(error) or type(error).__name__
+        self.errors.append(BlockError(kind, offset, sorted(set(paths)), message))
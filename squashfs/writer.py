@@ -0,0 +1,798 @@
+import hashlib
+import os
+import stat
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Deque, Dict, IO, Iterator, List, Optional, Tuple
+
+from .common import FileNotFoundError, NotADirectoryError, SquashError
+from .compressor import get_compressor
+from .dentry import DirectoryEntry, DirectoryIndex
+from .fragment import FragmentBlockEntry
+from .inode import Inode, InodeType
+from .metadata import METADATA_SIZE
+from .superblock import Superblock
+
+
+def _compress(compression_id: int, data: bytes) -> Tuple[bytes, bool]:
+    """Compress a block, falling back to storing it if compression does not
+    make it smaller. Module level so that it can run in a process pool."""
+    compressed = get_compressor(compression_id).compress(data)
+
+    if len(compressed) < len(data):
+        return compressed, True
+
+    return data, False
+
+
+class _Node:
+    __slots__ = (
+        "inode_type",
+        "permissions",
+        "uid",
+        "gid",
+        "modified_time",
+        "children",
+        "data",
+        "source",
+        "target_path",
+        "device",
+        "links",
+        "inode_number",
+        "ref",
+    )
+
+    def __init__(
+        self,
+        inode_type: InodeType,
+        permissions: int,
+        uid: int,
+        gid: int,
+        modified_time: int,
+    ) -> None:
+        self.inode_type = inode_type
+        self.permissions = permissions
+        self.uid = uid
+        self.gid = gid
+        self.modified_time = modified_time
+        # name -> child (directories)
+        self.children: Dict[bytes, "_Node"] = {}
+        # Contents of an in-memory file, or path of a file on disk
+        self.data: Optional[bytes] = None
+        self.source: Optional[str] = None
+        self.target_path = b""
+        self.device = 0
+        # Number of directory entries referencing this node (hard links)
+        self.links = 0
+        self.inode_number = 0
+        self.ref = -1
+
+
+class _MetadataWriter:
+    """Accumulates a table of metadata blocks (inode table, directory table,
+    ...) and tracks the reference of the current position."""
+
+    def __init__(self, writer: "Writer") -> None:
+        self.writer = writer
+        self.blks: List[bytes] = []
+        # Number of bytes in self.blks
+        self.size = 0
+        self.buffer = bytearray()
+        # Number of uncompressed bytes written so far
+        self.upos = 0
+
+    def tell(self) -> Tuple[int, int]:
+        """Return (offset of the current block from the start of the table,
+        offset within the block)."""
+        return self.size, len(self.buffer)
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        self.upos += len(data)
+
+        while len(self.buffer) >= METADATA_SIZE:
+            self._flush(bytes(self.buffer[:METADATA_SIZE]))
+            del self.buffer[:METADATA_SIZE]
+
+    def finish(self) -> List[bytes]:
+        if self.buffer:
+            self._flush(bytes(self.buffer))
+            self.buffer.clear()
+
+        return self.blks
+
+    def _flush(self, data: bytes) -> None:
+        payload, is_compressed = _compress(self.writer.compression_id, data)
+        header = len(payload) if is_compressed else len(payload) | 0x8000
+        blk = header.to_bytes(2, "little") + payload
+
+        self.blks.append(blk)
+        self.size += len(blk)
+
+
+class Writer:
+    """Builds a SquashFS 4.0 image from an in-memory tree and/or directory
+    trees on disk.
+
+    Data blocks are compressed on a pool of ``workers`` threads (or processes
+    if ``use_processes`` is set), file tails are packed into fragment blocks,
+    and files with identical contents are stored once.
+
+    >>> writer = Writer()
+    >>> writer.add_tree("rootfs")
+    >>> writer.add_file("etc/motd", b"hello\\n")
+    >>> writer.write("rootfs.sfs")
+    """
+
+    def __init__(
+        self,
+        blk_size: int = 128 << 10,
+        compression_id: int = 1,
+        workers: int = 1,
+        use_processes: bool = False,
+        fragments: bool = True,
+        dedupe: bool = True,
+        exportable: bool = True,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        if blk_size & (blk_size - 1) or not 4096 <= blk_size <= 1 << 20:
+            raise SquashError(f"Invalid block size {blk_size}")
+
+        # Fail early if the compressor is not available
+        get_compressor(compression_id)
+
+        self.blk_size = blk_size
+        self.compression_id = compression_id
+        self.workers = workers
+        self.use_processes = use_processes
+        self.fragments = fragments
+        self.dedupe = dedupe
+        self.exportable = exportable
+        self.modified_time = (
+            int(time.time()) if modified_time is None else modified_time
+        )
+        self.root = _Node(InodeType.DIRECTORY, 0o755, 0, 0, self.modified_time)
+
+    def add_directory(
+        self,
+        path: str,
+        permissions: int = 0o755,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        node = self._lookup(path)
+        node.permissions = permissions
+        node.uid = uid
+        node.gid = gid
+        if modified_time is not None:
+            node.modified_time = modified_time
+
+    def add_file(
+        self,
+        path: str,
+        data: bytes,
+        permissions: int = 0o644,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        node = self._add(path, InodeType.FILE, permissions, uid, gid, modified_time)
+        node.data = data
+
+    def add_symlink(
+        self,
+        path: str,
+        target: str,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        node = self._add(path, InodeType.SYMLINK, 0o777, uid, gid, modified_time)
+        node.target_path = os.fsencode(target)
+
+    def add_device(
+        self,
+        path: str,
+        major: int,
+        minor: int,
+        char: bool = True,
+        permissions: int = 0o644,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        inode_type = InodeType.CHAR_DEVICE if char else InodeType.BLOCK_DEVICE
+        node = self._add(path, inode_type, permissions, uid, gid, modified_time)
+        node.device = _encode_device(major, minor)
+
+    def add_fifo(
+        self,
+        path: str,
+        permissions: int = 0o644,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        self._add(path, InodeType.FIFO, permissions, uid, gid, modified_time)
+
+    def add_socket(
+        self,
+        path: str,
+        permissions: int = 0o755,
+        uid: int = 0,
+        gid: int = 0,
+        modified_time: Optional[int] = None,
+    ) -> None:
+        self._add(path, InodeType.SOCKET, permissions, uid, gid, modified_time)
+
+    def add_link(self, path: str, target: str) -> None:
+        """Add a hard link at ``path`` to the existing non-directory
+        ``target``."""
+        node = self._lookup(target, create=False)
+        if node.inode_type == InodeType.DIRECTORY:
+            raise SquashError("Cannot hard link a directory")
+
+        self._link(path, node)
+
+    def add_tree(self, src: str, dest: str = "") -> None:
+        """Add the directory tree at ``src`` on the local filesystem under
+        ``dest``. Hard links within the tree are preserved."""
+        # (st_dev, st_ino) -> node, to detect hard links
+        nodes: Dict[Tuple[int, int], _Node] = {}
+        self._add_tree(src, dest, nodes)
+
+    def write(self, dest: str) -> None:
+        with open(dest, "wb") as f:
+            _ImageBuilder(self, f).build()
+
+    def _add_tree(
+        self, src: str, dest: str, nodes: Dict[Tuple[int, int], _Node]
+    ) -> None:
+        st = os.lstat(src)
+        mtime = int(st.st_mtime)
+        permissions = stat.S_IMODE(st.st_mode)
+
+        if stat.S_ISDIR(st.st_mode):
+            self.add_directory(dest, permissions, st.st_uid, st.st_gid, mtime)
+            for name in sorted(os.listdir(src)):
+                self._add_tree(
+                    os.path.join(src, name), f"{dest}/{name}" if dest else name, nodes
+                )
+            return
+
+        key = (st.st_dev, st.st_ino)
+        if st.st_nlink > 1 and key in nodes:
+            self._link(dest, nodes[key])
+            return
+
+        if stat.S_ISREG(st.st_mode):
+            node = self._add(
+                dest, InodeType.FILE, permissions, st.st_uid, st.st_gid, mtime
+            )
+            node.source = src
+        elif stat.S_ISLNK(st.st_mode):
+            node = self._add(
+                dest, InodeType.SYMLINK, permissions, st.st_uid, st.st_gid, mtime
+            )
+            node.target_path = os.fsencode(os.readlink(src))
+        elif stat.S_ISBLK(st.st_mode) or stat.S_ISCHR(st.st_mode):
+            inode_type = (
+                InodeType.CHAR_DEVICE
+                if stat.S_ISCHR(st.st_mode)
+                else InodeType.BLOCK_DEVICE
+            )
+            node = self._add(dest, inode_type, permissions, st.st_uid, st.st_gid, mtime)
+            node.device = _encode_device(os.major(st.st_rdev), os.minor(st.st_rdev))
+        elif stat.S_ISFIFO(st.st_mode):
+            node = self._add(
+                dest, InodeType.FIFO, permissions, st.st_uid, st.st_gid, mtime
+            )
+        elif stat.S_ISSOCK(st.st_mode):
+            node = self._add(
+                dest, InodeType.SOCKET, permissions, st.st_uid, st.st_gid, mtime
+            )
+        else:
+            raise SquashError(f"Unsupported file type: {src}")
+
+        nodes[key] = node
+
+    def _add(
+        self,
+        path: str,
+        inode_type: InodeType,
+        permissions: int,
+        uid: int,
+        gid: int,
+        modified_time: Optional[int],
+    ) -> _Node:
+        if modified_time is None:
+            modified_time = self.modified_time
+
+        node = _Node(inode_type, permissions, uid, gid, modified_time)
+        self._link(path, node)
+
+        return node
+
+    def _link(self, path: str, node: _Node) -> None:
+        parent, _, name = path.strip("/").rpartition("/")
+        if not name:
+            raise SquashError("Cannot replace the root directory")
+
+        key = _check_name(name)
+        children = self._lookup(parent).children
+        old = children.get(key)
+        if old is not None:
+            old.links -= 1
+
+        children[key] = node
+        node.links += 1
+
+    def _lookup(self, path: str, create: bool = True) -> _Node:
+        """Return the node at ``path``. If ``create`` is set, the path must be a
+        directory and missing directories are created along the way."""
+        node = self.root
+        names = [_check_name(p) for p in path.split("/") if p]
+
+        for i, name in enumerate(names):
+            child = node.children.get(name)
+
+            if child is None:
+                if not create:
+                    raise FileNotFoundError(f"No such file or directory: {path}")
+                child = _Node(InodeType.DIRECTORY, 0o755, 0, 0, self.modified_time)
+                node.children[name] = child
+                child.links += 1
+            elif child.inode_type != InodeType.DIRECTORY and (
+                create or i < len(names) - 1
+            ):
+                raise NotADirectoryError(f"Not a directory: {path}")
+
+            node = child
+
+        return node
+
+
+def _check_name(name: str) -> bytes:
+    """Return a path component as stored in a directory entry, rejecting
+    names that readers would resolve outside of the directory."""
+    encoded = os.fsencode(name)
+    if encoded in (b"", b".", b"..") or b"\0" in encoded:
+        raise SquashError(f"Invalid file name: {name!r}")
+    if len(encoded) > 256:
+        raise SquashError(f"File name is too long: {name}")
+
+    return encoded
+
+
+def _encode_device(major: int, minor: int) -> int:
+    return (minor & 0xFF) | (major << 8) | ((minor & ~0xFF) << 12)
+
+
+class _FileEntry:
+    """Where the contents of a file were written."""
+
+    __slots__ = (
+        "blks_start",
+        "blk_sizes",
+        "fragment_blk_index",
+        "blk_offset",
+        "sparse",
+        "file_size",
+    )
+
+    def __init__(self) -> None:
+        self.blks_start = 0
+        self.blk_sizes: List[int] = []
+        self.fragment_blk_index = 0xFFFFFFFF
+        self.blk_offset = 0
+        self.sparse = 0
+        # Number of bytes read, which is what the blocks hold even if a file on
+        # disk changes while the image is built
+        self.file_size = 0
+
+
+class _ImageBuilder:
+    """Lays out the image for a Writer: superblock, data and fragment blocks,
+    then the inode, directory, fragment, export and ID tables."""
+
+    def __init__(self, writer: Writer, f: BinaryIO) -> None:
+        self.writer = writer
+        self.f = f
+        self.blk_size = writer.blk_size
+        self.sblk = Superblock()
+        self.executor: Optional[Executor] = None
+
+        # UID/GID -> index in the ID table
+        self.ids: Dict[int, int] = {}
+        # id() of a directory node -> inode number of its parent
+        self.parents: Dict[int, int] = {}
+        # Nodes in the order their inodes are written (children first)
+        self.nodes: List[_Node] = []
+
+        # Fragment blocks; start and size are filled in once written
+        self.fragment_entries: List[FragmentBlockEntry] = []
+        self.fragment_buffer = bytearray()
+        self.pending_fragments: Deque[
+            Tuple[int, "Future[Tuple[bytes, bool]]"]
+        ] = deque()
+
+        # sha256 of file contents -> entry, for deduplication
+        self.files: Dict[bytes, _FileEntry] = {}
+        # sha256 of a tail end -> (fragment index, offset)
+        self.tails: Dict[bytes, Tuple[int, int]] = {}
+        self.entries: Dict[int, _FileEntry] = {}
+
+        self.inode_table = _MetadataWriter(writer)
+        self.directory_table = _MetadataWriter(writer)
+
+    def build(self) -> None:
+        # Nodes keep their numbers and references from earlier builds
+        self._reset(self.writer.root)
+        self._number(self.writer.root)
+
+        # Reserve space for the superblock
+        self.f.write(bytes(96))
+
+        pool = ProcessPoolExecutor if self.writer.use_processes else ThreadPoolExecutor
+        with pool(self.writer.workers) as executor:
+            self.executor = executor
+
+            for node in self.nodes:
+                if node.inode_type == InodeType.FILE and id(node) not in self.entries:
+                    self.entries[id(node)] = self._write_file(node)
+                    self._write_fragments(False)
+
+            if self.fragment_buffer:
+                self._flush_fragment()
+            self._write_fragments(True)
+
+        for node in self.nodes:
+            self._write_inode(node)
+
+        sblk = self.sblk
+        sblk.magic = 0x73717368
+        sblk.inode_count = len(self.nodes)
+        sblk.modification_time = self.writer.modified_time
+        sblk.blk_size = self.blk_size
+        sblk.fragment_entry_count = len(self.fragment_entries)
+        sblk.compression_id = self.writer.compression_id
+        sblk.blk_log = self.blk_size.bit_length() - 1
+        sblk.id_count = len(self.ids)
+        sblk.version_major = 4
+        sblk.version_minor = 0
+        sblk.root_inode_ref = self.writer.root.ref
+        sblk.xattr_id_table_start = 0xFFFFFFFFFFFFFFFF
+        # NO_XATTRS
+        sblk.flags = 0x0200
+        if not self.writer.fragments:
+            # NO_FRAGMENTS
+            sblk.flags |= 0x0010
+        if self.writer.dedupe:
+            # DUPLICATES
+            sblk.flags |= 0x0040
+
+        sblk.inode_table_start = self.f.tell()
+        for blk in self.inode_table.finish():
+            self.f.write(blk)
+
+        sblk.directory_table_start = self.f.tell()
+        for blk in self.directory_table.finish():
+            self.f.write(blk)
+
+        sblk.fragment_table_start = self._write_table(
+            b"".join(entry.pack() for entry in self.fragment_entries)
+        )
+
+        sblk.export_table_start = 0xFFFFFFFFFFFFFFFF
+        if self.writer.exportable:
+            # EXPORTABLE
+            sblk.flags |= 0x0080
+            sblk.export_table_start = self._write_table(
+                b"".join(node.ref.to_bytes(8, "little") for node in self.nodes)
+            )
+
+        ids = sorted(self.ids, key=self.ids.__getitem__)
+        sblk.id_table_start = self._write_table(
+            b"".join(i.to_bytes(4, "little") for i in ids)
+        )
+
+        sblk.bytes_used = self.f.tell()
+        # Pad the image to a multiple of 4 KiB like mksquashfs does
+        self.f.write(bytes(-sblk.bytes_used % 4096))
+
+        self.f.seek(0)
+        self.f.write(sblk.pack())
+
+    def _reset(self, node: _Node) -> None:
+        node.inode_number = 0
+        node.ref = -1
+
+        for child in node.children.values():
+            self._reset(child)
+
+    def _number(self, node: _Node) -> None:
+        """Number inodes in the order they will be written: the children of a
+        directory come before the directory itself, and the root is last."""
+        for name in sorted(node.children):
+            child = node.children[name]
+            if child.inode_number == 0:
+                self._number(child)
+
+        self.nodes.append(node)
+        node.inode_number = len(self.nodes)
+
+        for child in node.children.values():
+            if child.inode_type == InodeType.DIRECTORY:
+                self.parents[id(child)] = node.inode_number
+
+    def _id(self, i: int) -> int:
+        if i not in self.ids:
+            if len(self.ids) >= 0xFFFF:
+                raise SquashError("Too many distinct UIDs/GIDs")
+            self.ids[i] = len(self.ids)
+
+        return self.ids[i]
+
+    def _read_chunks(self, node: _Node) -> Iterator[bytes]:
+        if node.data is not None:
+            for start in range(0, len(node.data), self.blk_size):
+                yield node.data[start : start + self.blk_size]
+            return
+
+        if node.source is None:
+            return
+
+        f: IO[bytes]
+        with open(node.source, "rb") as f:
+            while True:
+                chunk = f.read(self.blk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _write_file(self, node: _Node) -> _FileEntry:
+        assert self.executor is not None
+
+        entry = _FileEntry()
+        entry.blks_start = self.f.tell()
+        digest = hashlib.sha256()
+        zero_blk = bytes(self.blk_size)
+        tail = b""
+        # Bound the number of blocks held in memory while being compressed
+        window = 2 * self.writer.workers
+        futures: Deque["Optional[Future[Tuple[bytes, bool]]]"] = deque()
+
+        for chunk in self._read_chunks(node):
+            digest.update(chunk)
+            entry.file_size += len(chunk)
+
+            # The tail end of the file goes to a fragment
+            if len(chunk) < self.blk_size and self.writer.fragments:
+                tail = chunk
+                break
+
+            # Sparse blocks are stored as size 0 without any data
+            if chunk == zero_blk[: len(chunk)]:
+                futures.append(None)
+                entry.sparse += len(chunk)
+            else:
+                futures.append(
+                    self.executor.submit(_compress, self.writer.compression_id, chunk)
+                )
+
+            while len(futures) > window:
+                self._write_blk(entry, futures.popleft())
+
+        while futures:
+            self._write_blk(entry, futures.popleft())
+
+        key = digest.digest()
+        if self.writer.dedupe and key in self.files:
+            # Drop the blocks just written and share the existing copy
+            self.f.seek(entry.blks_start)
+            self.f.truncate()
+            return self.files[key]
+
+        if tail:
+            entry.fragment_blk_index, entry.blk_offset = self._add_tail(tail)
+
+        if self.writer.dedupe:
+            self.files[key] = entry
+
+        return entry
+
+    def _write_blk(
+        self, entry: _FileEntry, future: "Optional[Future[Tuple[bytes, bool]]]"
+    ) -> None:
+        if future is None:
+            entry.blk_sizes.append(0)
+            return
+
+        data, is_compressed = future.result()
+        self.f.write(data)
+        entry.blk_sizes.append(len(data) if is_compressed else len(data) | (1 << 24))
+
+    def _add_tail(self, tail: bytes) -> Tuple[int, int]:
+        key = hashlib.sha256(tail).digest()
+        if self.writer.dedupe and key in self.tails:
+            return self.tails[key]
+
+        if len(self.fragment_buffer) + len(tail) > self.blk_size:
+            self._flush_fragment()
+
+        location = (len(self.fragment_entries), len(self.fragment_buffer))
+        self.fragment_buffer += tail
+        if self.writer.dedupe:
+            self.tails[key] = location
+
+        return location
+
+    def _flush_fragment(self) -> None:
+        assert self.executor is not None
+
+        idx = len(self.fragment_entries)
+        self.fragment_entries.append(FragmentBlockEntry())
+        self.pending_fragments.append(
+            (
+                idx,
+                self.executor.submit(
+                    _compress, self.writer.compression_id, bytes(self.fragment_buffer)
+                ),
+            )
+        )
+        self.fragment_buffer.clear()
+
+    def _write_fragments(self, wait: bool) -> None:
+        """Write the fragment blocks that finished compressing. Only called
+        between files, since the data blocks of a file must be contiguous."""
+        while self.pending_fragments and (wait or self.pending_fragments[0][1].done()):
+            idx, future = self.pending_fragments.popleft()
+            data, is_compressed = future.result()
+
+            entry = self.fragment_entries[idx]
+            entry.start = self.f.tell()
+            entry.size = len(data)
+            entry.is_compressed = is_compressed
+            self.f.write(data)
+
+    def _write_inode(self, node: _Node) -> None:
+        if node.ref >= 0:
+            return
+
+        inode = Inode(self.sblk)
+        inode.permissions = node.permissions
+        inode.uid_idx = self._id(node.uid)
+        inode.gid_idx = self._id(node.gid)
+        inode.modified_time = node.modified_time
+        inode.inode_number = node.inode_number
+        inode.hard_link_count = node.links
+
+        if node.inode_type == InodeType.DIRECTORY:
+            self._write_directory(node, inode)
+        elif node.inode_type == InodeType.FILE:
+            entry = self.entries[id(node)]
+            inode.blks_start = entry.blks_start
+            inode.blk_sizes = array("I", entry.blk_sizes)
+            inode.fragment_blk_index = entry.fragment_blk_index
+            inode.blk_offset = entry.blk_offset
+            inode.file_size = entry.file_size
+            inode.sparse = entry.sparse
+
+            if (
+                inode.blks_start < 1 << 32
+                and inode.file_size < 1 << 32
+                and node.links == 1
+                and not inode.sparse
+            ):
+                inode.inode_type = InodeType.FILE.value
+            else:
+                inode.inode_type = InodeType.EX_FILE.value
+        else:
+            inode.inode_type = node.inode_type.value
+            inode.target_path = node.target_path
+            inode.device = node.device
+
+        blk, offset = self.inode_table.tell()
+        node.ref = (blk << 16) | offset
+        self.inode_table.write(inode.pack())
+
+    def _write_directory(self, node: _Node, inode: Inode) -> None:
+        """Write the listing of a directory to the directory table and fill in
+        the directory inode. Children must have been written already."""
+        inode.blk_idx, inode.blk_offset = self.directory_table.tell()
+        start = self.directory_table.upos
+        index: List[DirectoryIndex] = []
+
+        # Entries sharing a header; a new header starts when the inode block
+        # changes, the inode number is out of range, after 256 entries or when
+        # the listing crosses into a new metadata block
+        header: List[DirectoryEntry] = []
+        header_blk = header_number = header_pos = header_size = 0
+
+        for name in sorted(node.children):
+            child = node.children[name]
+            blk = child.ref >> 16
+            pos = self.directory_table.upos + 12 + header_size
+
+            if (
+                not header
+                or len(header) == 256
+                or blk != header_blk
+                or not -32768 <= child.inode_number - header_number <= 32767
+                or pos // METADATA_SIZE != header_pos // METADATA_SIZE
+            ):
+                self._write_header(header, header_blk, header_number)
+
+                header = []
+                header_size = 0
+                header_blk = blk
+                header_number = child.inode_number
+                header_pos = self.directory_table.upos
+
+                # Index the first header starting in each metadata block
+                if (header_pos // METADATA_SIZE) != (start // METADATA_SIZE) and (
+                    not index
+                    or header_pos // METADATA_SIZE
+                    != (start + index[-1].index) // METADATA_SIZE
+                ):
+                    dindex = DirectoryIndex()
+                    dindex.index = header_pos - start
+                    dindex.start = self.directory_table.tell()[0]
+                    dindex.name = name
+                    index.append(dindex)
+
+            dent = DirectoryEntry()
+            dent.offset = child.ref & 0xFFFF
+            dent.inode_offset = child.inode_number - header_number
+            dent.type = child.inode_type.value
+            dent.name = name
+            header.append(dent)
+            header_size += 8 + len(name)
+
+        self._write_header(header, header_blk, header_number)
+
+        inode.file_size = self.directory_table.upos - start + 3
+        inode.hard_link_count = 2 + sum(
+            child.inode_type == InodeType.DIRECTORY for child in node.children.values()
+        )
+        # The parent of the root is inode_count + 1
+        inode.parent_inode_number = self.parents.get(id(node), len(self.nodes) + 1)
+        inode.index = index
+
+        if index or inode.file_size > 0xFFFF:
+            inode.inode_type = InodeType.EX_DIRECTORY.value
+        else:
+            inode.inode_type = InodeType.DIRECTORY.value
+
+    def _write_header(
+        self, header: List[DirectoryEntry], blk: int, inode_number: int
+    ) -> None:
+        if not header:
+            return
+
+        data = (
+            (len(header) - 1).to_bytes(4, "little")
+            + blk.to_bytes(4, "little")
+            + inode_number.to_bytes(4, "little")
+        )
+        self.directory_table.write(data + b"".join(dent.pack() for dent in header))
+
+    def _write_table(self, data: bytes) -> int:
+        """Write a table as metadata blocks followed by the list of their
+        locations, and return the location of that list."""
+        writer = _MetadataWriter(self.writer)
+        writer.write(data)
+
+        locations = []
+        for blk in writer.finish():
+            locations.append(self.f.tell())
+            self.f.write(blk)
+
+        start = self.f.tell()
+        for location in locations:
+            self.f.write(location.to_bytes(8, "little"))
+
+        return start
@@ -0,0 +1,127 @@
+import struct
+from typing import Dict, Tuple, TYPE_CHECKING
+
+from .cache import LRUCache
+from .common import Mixin, ReadError
+from .metadata import METADATA_SIZE, MetadataTable
+
+if TYPE_CHECKING:
+    from .image import Image
+
+# xattr_ref, count and size of an xattr lookup table entry
+_LOOKUP_ENTRY = struct.Struct("<QII")
+# type, name_size of a key followed by the name and the value_size
+_KEY = struct.Struct("<HH")
+
+_PREFIXES = {0: b"user.", 1: b"trusted.", 2: b"security."}
+
+
+class XattrTable(Mixin):
+    """Maps xattr IDs to their key/value pairs.
+
+    Nothing is decoded up front: lookup table blocks and key/value metadata
+    blocks are decompressed the first time an ID stored in them is accessed,
+    and decoded pairs are memoized for up to ``cache_size`` IDs.
+    """
+
+    def __init__(
+        self, image: "Image", cache_size: int = 1024, metadata_cache_size: int = 8 << 20
+    ) -> None:
+        self.image = image
+        self.count = 0
+        self.lookup_start = 0
+        # lookup table block index -> decompressed block
+        self.lookup_cache: LRUCache[int, bytes] = LRUCache(metadata_cache_size)
+        # xattr ID -> decoded key/value pairs
+        self.cache: LRUCache[int, Dict[bytes, bytes]] = LRUCache(
+            cache_size, lambda _: 1
+        )
+        self.table = MetadataTable(image, 0, 0, True, metadata_cache_size)
+
+        sblk = image.sblk
+        if sblk.flags & 0x0200 or sblk.xattr_id_table_start == 0xFFFFFFFFFFFFFFFF:
+            return
+
+        # Parse the xattr ID table
+        header = image._read(sblk.xattr_id_table_start, 24)
+        kv_start, offset = self._read_uint64(header, 0)
+        self.count, offset = self._read_uint32(header, offset)
+        _, offset = self._read_uint32(header, offset)
+        self.lookup_start = sblk.xattr_id_table_start + offset
+
+        # The key/value table ends where the first lookup table block starts
+        kv_end = kv_start
+        if self.count:
+            kv_end, _ = self._read_uint64(header, offset)
+        self.table = MetadataTable(image, kv_start, kv_end, True, metadata_cache_size)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx: int) -> Dict[bytes, bytes]:
+        return self.cache.get_or_load(idx, lambda: self._decode(idx))
+
+    def _decode(self, idx: int) -> Dict[bytes, bytes]:
+        if not 0 <= idx < self.count:
+            raise KeyError(idx)
+
+        xattr_ref, count, _ = self._read_lookup_entry(idx)
+        xattrs: Dict[bytes, bytes] = {}
+
+        def decode(kv: memoryview, offset: int) -> int:
+            # The size in the lookup entry is the total listxattr size rather
+            # than the encoded size, so the buffer is grown until all pairs fit
+            xattrs.clear()
+            for _ in range(count):
+                typ, name_size = _KEY.unpack_from(kv, offset)
+                offset += _KEY.size
+                name, offset = self._read_string(kv, offset, name_size)
+                value_size, offset = self._read_uint32(kv, offset)
+
+                # value is stored out of line
+                if typ & 0x0100:
+                    value_ref, offset = self._read_uint64(kv, offset)
+                    value = self._read_value(value_ref)
+                else:
+                    value, offset = self._read_string(kv, offset, value_size)
+
+                prefix = _PREFIXES.get(typ & 0xFF)
+                if prefix is None:
+                    raise ReadError("Unknown xattr prefix type")
+
+                xattrs[prefix + name] = value
+
+            return offset
+
+        self.table.read_struct(
+            (xattr_ref >> 16) & 0xFFFFFFFF, xattr_ref & 0xFFFF, decode
+        )
+
+        return xattrs
+
+    def _read_lookup_entry(self, idx: int) -> Tuple[int, int, int]:
+        # Each metadata block of the lookup table holds 512 entries
+        blk_idx, offset = divmod(idx * _LOOKUP_ENTRY.size, METADATA_SIZE)
+
+        def load() -> bytes:
+            start, _ = self._read_uint64(
+                self.image._read(self.lookup_start + 8 * blk_idx, 8), 0
+            )
+            blk, _ = self.image._decompress_blk(start)
+            return blk
+
+        blk = self.lookup_cache.get_or_load(blk_idx, load)
+        xattr_ref, count, size = _LOOKUP_ENTRY.unpack_from(blk, offset)
+
+        return xattr_ref, count, size
+
+    def _read_value(self, value_ref: int) -> bytes:
+        blk = (value_ref >> 16) & 0xFFFFFFFF
+        offset = value_ref & 0xFFFF
+
+        buffer, pos = self.table.read(blk, offset, 4)
+        value_size, _ = self._read_uint32(buffer, pos)
+        buffer, pos = self.table.read(blk, offset, 4 + value_size)
+        value, _ = self._read_string(buffer, pos + 4, value_size)
+
+        return value
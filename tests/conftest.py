@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from squashfs.writer import Writer
+
+
+@pytest.fixture
+def build_image(tmp_path):
+    """Return a function writing an image with files of every type, a
+    duplicate, a sparse file, a hard link and many small files, and returning
+    its path. Keyword arguments are passed to Writer."""
+
+    def build(**kwargs):
+        writer = Writer(blk_size=4096, modified_time=1000, **kwargs)
+
+        writer.add_file("empty", b"")
+        writer.add_file("small", b"hello\n")
+        writer.add_file("text", b"squashfs " * 5000)
+        writer.add_file("random", os.urandom(10000))
+        writer.add_file("sparse", b"x" * 4096 + bytes(3 * 4096) + b"y" * 100)
+        writer.add_file("dir/copy", b"squashfs " * 5000, permissions=0o600, uid=1000)
+        writer.add_symlink("link", "small")
+        writer.add_device("dev", 8, 300, char=False)
+        writer.add_fifo("fifo")
+        writer.add_socket("sock")
+        writer.add_link("hardlink", "small")
+
+        for i in range(2000):
+            writer.add_file(f"many/{i:05d}", str(i).encode() * (i % 40))
+
+        path = str(tmp_path / "test.sfs")
+        writer.write(path)
+
+        return path
+
+    return build
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import squashfs.aio
+from squashfs.aio import AsyncImage
+from squashfs.common import NotAFileError
+from squashfs.image import Image
+from squashfs.writer import Writer
+
+
+def test_read():
+    async def main():
+        async with AsyncImage("tests/test_file.sfs") as image:
+            with Image("tests/test_file.sfs") as image2:
+                for file in await image.listdir():
+                    data = image2.open(file).read()
+
+                    assert (await image.stat(file)).size == len(data)
+                    assert await image.read(file) == data
+                    assert await image.read(file, 4000, 200000) == data[4000:204000]
+                    assert await image.read(file, len(data) + 1) == b""
+
+                    chunks = [chunk async for chunk in image.stream(file, 100)]
+                    assert b"".join(chunks) == data[100:]
+
+            with pytest.raises(NotAFileError):
+                await image.read("")
+
+    asyncio.run(main())
+
+
+def test_coalesce(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    writer = Writer(blk_size=4096)
+    writer.add_file("file", b"squashfs " * 2000)
+    writer.write(path)
+
+    async def main():
+        async with AsyncImage(path, executor=None) as image:
+            compressor = image.image.compressor
+            decompress = compressor.decompress
+            calls = []
+
+            def slow_decompress(data, max_size):
+                calls.append(threading.get_ident())
+                time.sleep(0.05)
+                return decompress(data, max_size)
+
+            compressor.decompress = slow_decompress
+
+            results = await asyncio.gather(*[image.read("file") for _ in range(8)])
+
+            assert all(r == b"squashfs " * 2000 for r in results)
+            # 4 data blocks and 1 fragment block, each decompressed once
+            assert len(calls) == 5
+
+    asyncio.run(main())
+
+
+def test_open(monkeypatch):
+    threads = []
+
+    class RecordingImage(Image):
+        def __init__(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(squashfs.aio, "Image", RecordingImage)
+
+    async def main():
+        async with await AsyncImage.open("tests/test_file.sfs", lazy=True) as image:
+            assert isinstance(image.image, RecordingImage)
+            assert await image.listdir() == ["128k", "129k", "256k", "4k"]
+
+    asyncio.run(main())
+
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_readahead(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    writer = Writer(blk_size=4096)
+    writer.add_file("file", b"squashfs " * 5000)
+    writer.write(path)
+
+    async def main():
+        async with AsyncImage(path, readahead=2) as image:
+            read_blk = image._read_blk
+            inflight = []
+            peak = 0
+
+            async def counting_read_blk(f, idx):
+                nonlocal peak
+                inflight.append(idx)
+                peak = max(peak, len(inflight))
+                try:
+                    await asyncio.sleep(0.01)
+                    return await read_blk(f, idx)
+                finally:
+                    inflight.remove(idx)
+
+            image._read_blk = counting_read_blk
+            assert await image.read("file") == b"squashfs " * 5000
+            assert peak == 2
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import struct
+import subprocess
+import sys
+from array import array
+
+import pytest
+
+from squashfs.arrays import decode_uint32, NUMPY_MIN_SIZE
+from squashfs.fragment import FragmentTable
+from squashfs.image import Image
+
+
+def test_decode_uint32():
+    assert decode_uint32(struct.pack("<3I", 1, 1000, 2**32 - 1), 3) == [
+        1,
+        1000,
+        2**32 - 1,
+    ]
+
+    # Large enough to be decoded with NumPy when it is installed
+    values = list(range(0, 2**32, 2**32 // NUMPY_MIN_SIZE))
+    assert (
+        decode_uint32(struct.pack(f"<{len(values)}I", *values), len(values)) == values
+    )
+
+
+def test_numpy_imported_lazily():
+    code = "import sys, squashfs.image; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, check=True)
+
+    assert out.stdout.strip() == b"False"
+
+
+def test_fragment_table():
+    table = FragmentTable(struct.pack("<QII", 96, (1 << 24) | 100, 0), 1)
+
+    assert len(table) == 1
+    assert table[0].start == 96
+    assert table[0].size == 100
+    assert not table[0].is_compressed
+
+    with pytest.raises(KeyError):
+        table[1]
+
+
+def test_vectorized():
+    np = pytest.importorskip("numpy")
+    from squashfs import arrays
+
+    sizes = array("I", [(1 << 24) | 100, 50, 0, 25])
+
+    assert arrays.compressed_mask(sizes).tolist() == [False, True, True, True]
+    assert arrays.stored_sizes(sizes).tolist() == [100, 50, 0, 25]
+    assert arrays.block_offsets(1000, sizes).tolist() == [1000, 1100, 1150, 1150]
+    assert arrays.size_totals(sizes) == (75, 100)
+
+    with Image("tests/test_file.sfs") as image:
+        fragments = arrays.fragment_array(image.fragments)
+        assert fragments["start"].tolist() == [image.fragments[0].start]
+        assert fragments.dtype == arrays.fragment_dtype()
+        assert np.all(~arrays.compressed_mask(fragments["size"]))
@@ -1,3 +1,6 @@
+import pytest
+
+from squashfs.common import FileNotFoundError, NotADirectoryError
 from squashfs.image import Image
 
 
@@ -54,3 +57,78 @@ def test_inode_types():
         assert info.is_socket
         assert info.uid == 1000
         assert info.gid == 1000
+
+
+def test_lookup():
+    with Image("tests/test_basic.sfs") as image:
+        inode_numbers = {image.get_inode(name).inode_number for name in image.listdir()}
+        assert len(inode_numbers) == 7
+
+        for path in ["000", "001_directory0", "002_file/foo", "zzz", "001_directory/x"]:
+            with pytest.raises(FileNotFoundError):
+                image.get_inode(path)
+
+
+def test_path_cache():
+    with Image("tests/test_basic.sfs") as image:
+        image.stat("001_directory")
+        hits = image.path_cache.hits
+
+        image.stat("/001_directory/")
+        assert image.path_cache.hits == hits + 1
+
+        with pytest.raises(FileNotFoundError):
+            image.stat("missing/child")
+        # Negative entries are cached as well
+        with pytest.raises(FileNotFoundError):
+            image.stat("missing/child")
+        assert image.path_cache.hits == hits + 2
+
+        assert image.get_inode("002_file") is image.get_inode("002_file")
+        assert image.inode_cache.hit_rate > 0
+
+
+def test_scandir():
+    with Image("tests/test_basic.sfs") as image:
+        entries = list(image.scandir())
+
+        assert [entry.name for entry in entries] == image.listdir()
+        assert [entry.is_dir() for entry in entries] == [True] + [False] * 6
+        assert entries[1].is_file()
+        assert entries[2].is_symlink()
+        assert entries[3].stat().is_block_dev
+
+        assert list(image.walk()) == [
+            ("", ["001_directory"], image.listdir()[1:]),
+            ("001_directory", [], []),
+        ]
+
+        with pytest.raises(NotADirectoryError):
+            image.listdir("002_file")
+
+
+def test_export_table():
+    with Image("tests/test_basic.sfs") as image:
+        for name in image.listdir():
+            inode = image.get_inode(name)
+            inode2 = image.inode_by_number(inode.inode_number)
+            assert inode2.inode_type == inode.inode_type
+            assert inode2.inode_number == inode.inode_number
+
+        directory = image.get_inode("001_directory")
+        assert image.parent(directory) is image.root_inode
+        assert image.parent(image.root_inode) is image.root_inode
+
+        with pytest.raises(FileNotFoundError):
+            image.inode_by_number(image.sblk.inode_count + 1)
+
+        assert image.hard_links() == {}
+
+
+def test_compact_inodes():
+    with Image("tests/test_basic.sfs") as image:
+        inode = image.get_inode("002_file")
+
+        assert not hasattr(inode, "__dict__")
+        assert not hasattr(image.root_inode, "__dict__")
+        assert inode.blk_sizes.typecode == "I"
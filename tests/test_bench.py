@@ -0,0 +1,22 @@
+from squashfs.bench import SHAPES, generate, measure
+from squashfs.image import Image
+
+
+def test_generate(tmp_path):
+    for shape in SHAPES:
+        path = str(tmp_path / f"{shape}.sfs")
+        generate(shape, path, scale=0.01)
+
+        with Image(path) as image:
+            assert image.listdir()
+
+
+def test_measure(tmp_path):
+    path = str(tmp_path / "fragments.sfs")
+    generate("fragments", path, scale=0.01)
+
+    results = measure(path)
+
+    assert results["entries"] == 70
+    assert results["seq_read_mb_per_s"] > 0
+    assert results["lookup_cold_us"] > 0
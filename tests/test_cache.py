@@ -0,0 +1,49 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from squashfs.cache import LRUCache
+
+
+def test_lru_cache():
+    cache: LRUCache[int, bytes] = LRUCache(10)
+
+    cache.put(0, b"aaaa")
+    cache.put(1, b"bbbb")
+    assert cache.get(0) == b"aaaa"
+    assert cache.size == 8
+
+    # Evicts the least recently used entry (1)
+    cache.put(2, b"cccc")
+    assert 1 not in cache
+    assert cache.get(1) is None
+    assert cache.size == 8
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
+
+    # Values larger than the capacity are never cached
+    cache.put(3, b"d" * 11)
+    assert 3 not in cache
+
+    assert cache.get_or_load(4, lambda: b"ee") == b"ee"
+    assert cache.get_or_load(4, lambda: b"ff") == b"ee"
+
+
+def test_concurrent_load():
+    cache: LRUCache[int, bytes] = LRUCache(100)
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.wait(1)
+        return b"value"
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(cache.get_or_load, 0, loader) for _ in range(8)]
+        time.sleep(0.05)
+        started.set()
+
+        assert all(future.result() == b"value" for future in futures)
+
+    assert len(calls) == 1
+    assert len(cache._loading) == 0
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from squashfs.__main__ import main
+from squashfs.image import Image
+
+
+def test_ls(capsys):
+    main(["ls", "-lR", "tests/test_basic.sfs"])
+    out = capsys.readouterr().out.splitlines()
+
+    assert out[0] == ".:"
+    assert out[1].startswith("drwxrwxr-x")
+    assert out[3].endswith("003_symlink -> 002_file")
+    assert out[3].split()[1] == "1"
+    assert out[3].split()[4] == str(len("002_file"))
+    assert out[4].startswith("brw-r--r--")
+    assert "7, 0" in out[4]
+    assert out[-1] == "001_directory:"
+
+
+def test_stat(capsys):
+    main(["stat", "tests/test_file.sfs", "129k"])
+    out = capsys.readouterr().out.splitlines()
+
+    assert "Type: regular file" in out
+    assert "Links: 1" in out
+    assert f"Size: {129 * 1024}" in out
+    assert "Blocks: 2" in out
+
+
+def test_cat(capsysbinary):
+    main(["cat", "tests/test_file.sfs", "4k", "129k"])
+    out = capsysbinary.readouterr().out
+
+    with Image("tests/test_file.sfs") as image:
+        assert out == image.open("4k").read() + image.open("129k").read()
+
+
+def test_extract(tmp_path):
+    main(["extract", "tests/test_file.sfs", "-d", str(tmp_path), "--jobs", "4"])
+
+    with Image("tests/test_file.sfs") as image:
+        for name in image.listdir():
+            with open(os.path.join(tmp_path, name), "rb") as f:
+                assert f.read() == image.open(name).read()
+
+
+def test_du(capsys):
+    main(["du", "-s", "tests/test_file.sfs"])
+
+    assert capsys.readouterr().out == f"{(4 + 128 + 129 + 256) * 1024}\t.\n"
+
+
+def test_error(capsys):
+    with pytest.raises(SystemExit) as e:
+        main(["stat", "tests/test_basic.sfs", "missing"])
+
+    assert e.value.code == 1
+    assert "FileNotFoundError" in capsys.readouterr().err
+
+
+def test_manifest(capsys):
+    main(["manifest", "tests/test_file.sfs", "--jobs", "2"])
+    out = capsys.readouterr().out.splitlines()
+
+    assert [line.split("  ")[1] for line in out] == ["128k", "129k", "256k", "4k"]
+
+
+def test_bench(capsys):
+    main(["bench", "tests/test_basic.sfs"])
+    results = json.loads(capsys.readouterr().out)
+
+    assert results["entries"] == 7
+    assert results["lookup_cold_us"] > 0
@@ -0,0 +1,51 @@
+import lzma
+import struct
+import zlib
+
+import pytest
+
+from squashfs.common import ReadError
+from squashfs.compressor import get_compressor
+
+DATA = b"squashfs" * 1024
+
+
+def test_gzip():
+    compressor = get_compressor(1)
+    assert compressor.decompress(zlib.compress(DATA), len(DATA)) == DATA
+
+    options = memoryview(struct.pack("<IHH", 6, 14, 1))
+    assert compressor.read_options(options, 0) == 8
+    assert compressor.compression_level == 6
+    assert compressor.window_size == 14
+
+
+def test_lzma():
+    compressor = get_compressor(2)
+    data = lzma.compress(DATA, format=lzma.FORMAT_ALONE)
+    assert compressor.decompress(data, len(DATA)) == DATA
+
+
+def test_xz():
+    compressor = get_compressor(4)
+    data = lzma.compress(DATA, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC32)
+    assert compressor.decompress(data, len(DATA)) == DATA
+
+
+def test_lz4():
+    lz4_block = pytest.importorskip("lz4.block")
+    compressor = get_compressor(5)
+    data = lz4_block.compress(DATA, store_size=False)
+    assert compressor.decompress(data, len(DATA)) == DATA
+
+
+def test_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    compressor = get_compressor(6)
+    data = zstandard.ZstdCompressor().compress(DATA)
+    assert compressor.decompress(data, len(DATA)) == DATA
+
+
+def test_unknown():
+    with pytest.raises(ReadError):
+        get_compressor(42)
@@ -0,0 +1,122 @@
+import os
+import stat
+
+import pytest
+
+import squashfs.writer
+from squashfs.image import Image
+from squashfs.writer import Writer
+
+
+def test_extract_types(tmp_path):
+    dest = str(tmp_path / "out")
+
+    with Image("tests/test_basic.sfs") as image:
+        image.extract("", dest)
+
+        assert sorted(os.listdir(dest)) == image.listdir()
+
+        for name in image.listdir():
+            info = image.stat(name)
+            st = os.lstat(os.path.join(dest, name))
+
+            assert st.st_mtime == info.modified_time
+            if not info.is_symlink:
+                assert stat.S_IMODE(st.st_mode) == info.permissions
+
+        assert stat.S_ISDIR(os.lstat(os.path.join(dest, "001_directory")).st_mode)
+        assert stat.S_ISREG(os.lstat(os.path.join(dest, "002_file")).st_mode)
+        assert stat.S_ISLNK(os.lstat(os.path.join(dest, "003_symlink")).st_mode)
+        assert stat.S_ISFIFO(os.lstat(os.path.join(dest, "006_fifo")).st_mode)
+        assert stat.S_ISSOCK(os.lstat(os.path.join(dest, "007_socket")).st_mode)
+
+
+def test_extract_files(tmp_path):
+    dest = str(tmp_path / "out")
+
+    with Image("tests/test_file.sfs") as image:
+        image.extract("", dest, workers=4)
+
+        for name in image.listdir():
+            with open(os.path.join(dest, name), "rb") as f:
+                assert f.read() == image.open(name).read()
+
+        image.extract("129k", str(tmp_path / "single"))
+        with open(str(tmp_path / "single"), "rb") as f:
+            assert f.read() == image.open("129k").read()
+
+
+def test_extract_xattrs(tmp_path):
+    if not hasattr(os, "getxattr"):
+        return
+
+    dest = str(tmp_path / "out")
+
+    with Image("tests/test_xattr.sfs") as image:
+        image.extract("", dest)
+
+        path = os.path.join(dest, "bar")
+        if "user.shatag.sha256" in os.listxattr(path):
+            assert (
+                os.getxattr(path, "user.shatag.sha256")
+                == image.stat("bar").xattrs[b"user.shatag.sha256"]
+            )
+
+
+def test_extract_invalid_names(tmp_path):
+    writer = Writer(modified_time=1000)
+    writer.add_file("up/evil", b"evil")
+    writer.add_file("sub/evil", b"evil")
+    writer.add_file("ok", b"ok")
+
+    # Rename the entries behind the writer's back to craft a malicious image
+    children = writer.root.children
+    children[b".."] = children.pop(b"up")
+    children[b"a/.."] = children.pop(b"sub")
+
+    path = str(tmp_path / "evil.sfs")
+    writer.write(path)
+
+    dest = tmp_path / "a" / "b" / "out"
+    with Image(path) as image, pytest.warns(UserWarning, match="invalid or duplicate file name"):
+        image.extract("", str(dest))
+
+    assert os.listdir(str(dest)) == ["ok"]
+    assert not (tmp_path / "a" / "b" / "evil").exists()
+    assert not (dest / "a").exists()
+
+
+def test_extract_symlink_traversal(tmp_path, monkeypatch):
+    outside = tmp_path / "outside"
+    outside.mkdir(mode=0o700)
+
+    # Store metadata uncompressed so that entry names can be patched in place
+    monkeypatch.setattr(squashfs.writer, "_compress", lambda _, data: (data, False))
+    writer = Writer(modified_time=1000)
+    writer.add_symlink("aaaa", str(outside))
+    writer.add_file("aaab/pwned", b"evil", permissions=0o777)
+    writer.add_directory("aaab", permissions=0o777)
+
+    path = tmp_path / "evil.sfs"
+    writer.write(str(path))
+    path.write_bytes(path.read_bytes().replace(b"aaab", b"aaaa"))
+
+    dest = tmp_path / "out"
+    with Image(str(path)) as image:
+        assert image.listdir() == ["aaaa", "aaaa"]
+        with pytest.warns(UserWarning, match="duplicate file name"):
+            image.extract("", str(dest))
+
+    assert os.readlink(str(dest / "aaaa")) == str(outside)
+    assert os.listdir(str(outside)) == []
+    assert stat.S_IMODE(os.stat(str(outside)).st_mode) == 0o700
+
+    # A symlink already in the destination is not written through either
+    dest = tmp_path / "out2"
+    dest.mkdir()
+    os.symlink(str(outside / "4k"), str(dest / "4k"))
+    with Image("tests/test_file.sfs") as image:
+        with pytest.warns(UserWarning, match="existing symlink"):
+            image.extract("", str(dest))
+
+    assert os.listdir(str(outside)) == []
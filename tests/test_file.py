@@ -1,5 +1,11 @@
+import copy
 import hashlib
+import io
+import mmap
 
+import pytest
+
+from squashfs.file import File, SEEK_DATA, SEEK_HOLE
 from squashfs.image import Image
 
 
@@ -8,11 +14,86 @@ def test_inode_types():
         "128k": "ad9ceb1109d6f89d26ea6bd6bb04c3aee487847f",
         "129k": "d89d33c0a206db9c4541c913136cacb3e15b4a1b",
         "256k": "a07988abd80b105a79c67ccef59c55f264854b66",
-        "4k": "5381f594537fb26e45c5924d4bf1e3d9b54e52bb"
+        "4k": "5381f594537fb26e45c5924d4bf1e3d9b54e52bb",
     }
 
     with Image("tests/test_file.sfs") as image:
         for file in image.listdir():
-            data = image.open(file)
+            data = image.open(file).read()
 
             assert hashlib.sha1(data).hexdigest() == DIGESTS[file]
+
+
+def test_seek():
+    with Image("tests/test_file.sfs") as image:
+        for file in image.listdir():
+            data = image.open(file).read()
+            f = image.open(file)
+
+            for offset in [0, 1, 4095, 4096, 131071, 131072, 131073, len(data) - 1]:
+                assert f.seek(offset) == offset
+                assert f.tell() == offset
+                assert f.read(4097) == data[offset : offset + 4097]
+
+            assert f.seek(-10, io.SEEK_END) == len(data) - 10
+            assert f.read() == data[-10:]
+            assert f.read() == b""
+
+            buffer = bytearray(1000)
+            f.seek(130000)
+            assert f.readinto(buffer) == min(1000, max(len(data) - 130000, 0))
+
+
+def test_parallel_read():
+    with Image("tests/test_file.sfs") as image, Image(
+        "tests/test_file.sfs", workers=4
+    ) as image2:
+        for file in image.listdir():
+            data = image.open(file).read()
+
+            assert image2.open(file).read() == data
+
+            f = image2.open(file)
+            f.seek(100)
+            assert f.read() == data[100:]
+
+
+def test_sparse():
+    with Image("tests/test_file.sfs") as image:
+        data = image.open("128k").read()
+        blk_size = image.sblk.blk_size
+
+        # A file made of a hole, the data block of "128k" and another hole
+        inode = copy.copy(image.get_inode("128k"))
+        inode.blk_sizes = [0, inode.blk_sizes[0], 0]
+        inode.file_size = 3 * blk_size - 100
+        f = File(image, inode)
+
+        assert f.readall() == bytes(blk_size) + data + bytes(blk_size - 100)
+
+        assert f.seek(10, SEEK_DATA) == blk_size
+        assert f.seek(blk_size + 10, SEEK_DATA) == blk_size + 10
+        assert f.seek(10, SEEK_HOLE) == 10
+        assert f.seek(blk_size, SEEK_HOLE) == 2 * blk_size
+        with pytest.raises(OSError):
+            f.seek(2 * blk_size, SEEK_DATA)
+
+
+def test_readview():
+    with Image("tests/test_file.sfs") as image:
+        for file in image.listdir():
+            data = image.open(file).read()
+            f = image.open_raw(file)
+
+            chunks = []
+            while True:
+                view = f.readview(100000)
+                if not view:
+                    break
+                assert len(view) <= 100000
+                chunks.append(view.tobytes())
+            assert b"".join(chunks) == data
+
+        # Uncompressed blocks are views into the image itself
+        f = image.open_raw("128k")
+        assert isinstance(f.readview().obj, mmap.mmap)
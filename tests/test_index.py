@@ -0,0 +1,110 @@
+import os
+import struct
+
+import pytest
+
+from squashfs.common import FileNotFoundError
+from squashfs.image import Image
+from squashfs.index import build_index
+from squashfs.writer import Writer
+
+
+def contents(image):
+    result = {}
+    for dirpath, _, filenames in image.walk():
+        for name in filenames:
+            path = f"{dirpath}/{name}" if dirpath else name
+            info = image.stat(path)
+            result[path] = (
+                image.open(path).read() if info.is_file else None,
+                repr(info),
+            )
+
+    return result
+
+
+@pytest.mark.parametrize(
+    "path", ["tests/test_basic.sfs", "tests/test_file.sfs", "tests/test_xattr.sfs"]
+)
+def test_index(tmp_path, path):
+    index = str(tmp_path / "test.idx")
+
+    with Image(path) as image:
+        build_index(image, index)
+        expected = contents(image)
+
+    with Image(path, index=index) as image:
+        assert image.index is not None
+        assert contents(image) == expected
+
+        with pytest.raises(FileNotFoundError):
+            image.get_inode("missing")
+
+
+def test_stale_index(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    index = str(tmp_path / "test.idx")
+
+    writer = Writer(modified_time=1)
+    for i in range(100):
+        writer.add_file(f"dir/{i}", os.urandom(i * 300))
+    writer.write(path)
+
+    with Image(path) as image:
+        build_index(image, index)
+
+    with Image(path, index=index) as image:
+        assert image.index is not None
+        assert image.inode_by_number(1).inode_number == 1
+        assert len(image.listdir("dir")) == 100
+
+    writer.add_file("new", b"data")
+    writer.write(path)
+
+    with pytest.warns(UserWarning):
+        with Image(path, index=index) as image:
+            assert image.index is None
+            assert image.open("new").read() == b"data"
+
+    with pytest.warns(UserWarning):
+        with Image(path, index=str(tmp_path / "missing.idx")) as image:
+            assert image.index is None
+
+
+@pytest.mark.parametrize("size", [0, 10, 60])
+def test_truncated_index(tmp_path, size):
+    index = str(tmp_path / "test.idx")
+
+    with Image("tests/test_file.sfs") as image:
+        build_index(image, index)
+
+    with open(index, "r+b") as f:
+        f.truncate(size)
+
+    with pytest.warns(UserWarning, match="truncated"):
+        with Image("tests/test_file.sfs", index=index) as image:
+            assert image.index is None
+            assert image.listdir() == ["128k", "129k", "256k", "4k"]
+
+
+def test_misaligned_section(tmp_path):
+    index = str(tmp_path / "test.idx")
+
+    with Image("tests/test_file.sfs") as image:
+        build_index(image, index)
+
+    # Shrink the export section to a length that is not a multiple of 8
+    with open(index, "r+b") as f:
+        data = bytearray(f.read())
+        count = struct.unpack_from("<I", data, 12)[0]
+        for i in range(count):
+            pos = 40 + i * 24
+            name, offset, size = struct.unpack_from("<8sQQ", data, pos)
+            if name.rstrip(b"\0") == b"export":
+                struct.pack_into("<8sQQ", data, pos, name, offset, size - 1)
+        f.seek(0)
+        f.write(data)
+
+    with pytest.warns(UserWarning, match="export"):
+        with Image("tests/test_file.sfs", index=index) as image:
+            assert image.index is None
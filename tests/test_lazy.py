@@ -0,0 +1,23 @@
+from squashfs.image import Image
+
+
+def test_lazy_metadata():
+    with Image("tests/test_basic.sfs") as eager, Image(
+        "tests/test_basic.sfs", lazy=True
+    ) as lazy:
+        assert len(lazy.inode_table.cache) == 1
+        assert len(lazy.directory_table.cache) == 0
+
+        assert lazy.listdir() == eager.listdir()
+        for name in eager.listdir():
+            assert lazy.stat(name).permissions == eager.stat(name).permissions
+            assert lazy.stat(name).uid == eager.stat(name).uid
+
+        assert lazy.inode_table.cache.hits > 0
+
+
+def test_lazy_metadata_eviction():
+    with Image("tests/test_xattr2.sfs", lazy=True, metadata_cache_size=0) as image:
+        assert len(image.listdir()) == 8
+        assert len(image.inode_table.cache) == 0
+        assert image.inode_table.cache.hits == 0
@@ -0,0 +1,80 @@
+import http.client
+import threading
+
+import pytest
+
+from squashfs.image import Image
+from squashfs.server import ImageServer, parse_range
+
+
+@pytest.fixture
+def server():
+    with Image("tests/test_file.sfs") as image:
+        with ImageServer(image, ("127.0.0.1", 0), quiet=True) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            yield server
+            server.shutdown()
+            thread.join()
+
+
+def request(server, path, headers={}, method="GET"):
+    conn = http.client.HTTPConnection(*server.server_address)
+    conn.request(method, path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+
+    return response, body
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 100)
+    assert parse_range("bytes=900-", 1000) == (900, 1000)
+    assert parse_range("bytes=-100", 1000) == (900, 1000)
+    assert parse_range("bytes=900-2000", 1000) == (900, 1000)
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
+
+
+def test_serve(server):
+    image = server.image
+    data = image.open("129k").read()
+
+    response, body = request(server, "/")
+    assert response.status == 200
+    assert "129k" in body.decode()
+
+    response, body = request(server, "/129k")
+    assert response.status == 200
+    assert body == data
+    etag = response.getheader("ETag")
+
+    response, body = request(server, "/129k", {"Range": "bytes=131000-131099"})
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes 131000-131099/{len(data)}"
+    assert body == data[131000:131100]
+
+    response, body = request(server, "/129k", {"Range": "bytes=-10"})
+    assert body == data[-10:]
+
+    response, body = request(server, "/129k", {"Range": f"bytes={len(data)}-"})
+    assert response.status == 416
+
+    response, body = request(server, "/129k", {"If-None-Match": etag})
+    assert response.status == 304
+
+    response, body = request(
+        server, "/129k", {"Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+    assert response.status == 200
+    assert body == data
+
+    response, body = request(server, "/129k", method="HEAD")
+    assert response.getheader("Content-Length") == str(len(data))
+    assert body == b""
+
+    response, body = request(server, "/missing")
+    assert response.status == 404
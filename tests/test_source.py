@@ -0,0 +1,69 @@
+import hashlib
+
+import pytest
+
+from squashfs.image import Image
+from squashfs.source import (
+    ChunkedSource,
+    FileObjectSource,
+    LatencySource,
+    PreadSource,
+    RangeSource,
+)
+from squashfs.writer import Writer
+
+
+def digest(image):
+    h = hashlib.sha1()
+    for dirpath, _, filenames in image.walk():
+        for name in filenames:
+            path = f"{dirpath}/{name}" if dirpath else name
+            h.update(path.encode())
+            if image.stat(path).is_file:
+                h.update(image.open(path).read())
+            h.update(repr(image.stat(path)).encode())
+
+    return h.hexdigest()
+
+
+@pytest.mark.parametrize(
+    "path", ["tests/test_basic.sfs", "tests/test_file.sfs", "tests/test_xattr.sfs"]
+)
+def test_sources(path):
+    with Image(path) as image:
+        expected = digest(image)
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+        with Image(f.fileno()) as image:
+            assert digest(image) == expected
+
+        with Image(f) as image:
+            assert digest(image) == expected
+        assert not f.closed
+
+    source = RangeSource(lambda offset, size: data[offset : offset + size], len(data))
+    with Image(source) as image:
+        assert digest(image) == expected
+
+    with Image(ChunkedSource(FileObjectSource(open(path, "rb")), 4096)) as image:
+        assert digest(image) == expected
+
+
+def test_coalescing(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    writer = Writer(blk_size=4096)
+    for i in range(500):
+        writer.add_file(f"dir{i % 10}/file{i}", str(i).encode() * (i * 7 % 5000))
+    writer.write(path)
+
+    with Image(LatencySource(PreadSource(path), 0)) as image:
+        expected = digest(image)
+        direct = image.source.requests
+
+    source = LatencySource(PreadSource(path), 0)
+    with Image(ChunkedSource(source, 64 << 10), lazy=True) as image:
+        assert digest(image) == expected
+
+    assert source.requests * 10 < direct
@@ -0,0 +1,49 @@
+import pytest
+
+from squashfs.common import FileNotFoundError
+from squashfs.image import Image
+from squashfs.stats import Histogram
+from squashfs.writer import Writer
+
+
+def test_histogram():
+    histogram = Histogram()
+    for us in [1, 2, 3, 100, 1000]:
+        histogram.add(us / 1e6)
+
+    assert histogram.count == 5
+    assert histogram.percentile(50) == 4 / 1e6
+    assert histogram.percentile(100) == 1000 / 1e6
+    assert histogram.snapshot()["buckets_us"] == {2: 1, 4: 2, 128: 1, 1024: 1}
+
+
+def test_stats(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    writer = Writer(blk_size=4096)
+    writer.add_file("dir/file", b"squashfs " * 2000)
+    writer.write(path)
+
+    with Image(path) as image:
+        assert "counters" not in image.stats()
+
+    events = []
+    with Image(path, lazy=True, stats=True) as image:
+        image.add_hook(lambda *args: events.append(args))
+
+        assert image.open("dir/file").read() == b"squashfs " * 2000
+        with pytest.raises(FileNotFoundError):
+            image.get_inode("dir/missing")
+
+        stats = image.stats()
+        counters = stats["counters"]
+        assert stats["codec"] == "gzip"
+        assert counters["decompress.data"] == 4
+        assert counters["decompress.data.bytes"] == 4 * 4096
+        assert counters["decompress.fragment"] == 1
+        assert counters["decompress.metadata"] >= 2
+        assert counters["lookup.not_found"] == 1
+        assert stats["histograms"]["lookup.directory"]["count"] == 3
+        assert stats["caches"]["block"]["misses"] == 5
+        assert stats["source"]["requests"] > 0
+
+        assert ("decompress.data", 4096) in [(e[0], e[3]) for e in events]
@@ -0,0 +1,43 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from squashfs.image import Image
+from squashfs.writer import Writer
+
+
+def test_shared_image(tmp_path):
+    path = str(tmp_path / "test.sfs")
+    writer = Writer(blk_size=4096)
+    expected = {}
+    for i in range(300):
+        name = f"dir{i % 7}/file{i:03d}"
+        expected[name] = f"{i} ".encode() * (i * 37 % 3000)
+        writer.add_file(name, expected[name], uid=i % 5)
+    writer.write(path)
+
+    # Small caches so that threads keep evicting each other's entries
+    with Image(
+        path,
+        lazy=True,
+        metadata_cache_size=16 << 10,
+        block_cache_size=16 << 10,
+        path_cache_size=32,
+        inode_cache_size=32,
+    ) as image:
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(200):
+                name = rng.choice(list(expected))
+                assert image.stat(name).size == len(expected[name])
+                assert image.stat(name).uid == int(name[-3:]) % 5
+
+                f = image.open(name)
+                offset = rng.randrange(len(expected[name]) + 1)
+                f.seek(offset)
+                assert f.read(5000) == expected[name][offset : offset + 5000]
+
+            return True
+
+        with ThreadPoolExecutor(16) as executor:
+            assert all(executor.map(worker, range(64)))
@@ -0,0 +1,101 @@
+import hashlib
+
+import pytest
+
+from squashfs.__main__ import main
+from squashfs.common import ReadError
+from squashfs.image import Image
+
+
+def test_manifest(build_image):
+    path = build_image()
+
+    with Image(path) as image:
+        assert image.verify(workers=4) == []
+
+        manifest = image.manifest(workers=4)
+        paths = [
+            entry.path
+            for top, _, _ in image.walk()
+            for entry in image.scandir(top)
+            if entry.is_file()
+        ]
+
+        assert list(manifest) == sorted(paths)
+        for p, digest in manifest.items():
+            assert digest == hashlib.sha256(image.open(p).read()).hexdigest()
+
+
+def test_corrupt_block(build_image):
+    path = build_image()
+
+    with Image(path) as image:
+        offset = image.get_inode("text").blks_start
+
+    # Overwrite the first block of "text", which "dir/copy" shares
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(b"\xff" * 16)
+
+    with Image(path) as image:
+        errors = image.verify(workers=2)
+
+        assert len(errors) == 1
+        assert errors[0].kind == "data"
+        assert errors[0].offset == offset
+        assert errors[0].paths == ["dir/copy", "text"]
+
+        with pytest.raises(ReadError):
+            image.manifest()
+
+
+def test_corrupt_export_table(build_image):
+    path = build_image()
+
+    with Image(path) as image:
+        locations = image._read(image.sblk.export_table_start, 8)
+        offset, _ = image._read_uint64(locations, 0)
+
+    # Corrupt the payload of the first export table block, keeping its header
+    with open(path, "r+b") as f:
+        f.seek(offset + 2)
+        f.write(b"\xff" * 16)
+
+    with Image(path) as image:
+        errors = image.verify()
+
+        assert [(error.kind, error.offset) for error in errors] == [
+            ("metadata", offset)
+        ]
+
+
+def test_corrupt_directory_table(build_image, capsys):
+    path = build_image()
+
+    with Image(path) as image:
+        offset = image.sblk.directory_table_start
+
+    # Corrupt the payload of the first directory table block, keeping its header
+    with open(path, "r+b") as f:
+        f.seek(offset + 2)
+        f.write(b"\xff" * 16)
+
+    # An eager image decompresses the directory table when it is opened
+    with pytest.raises(ReadError):
+        Image(path)
+
+    with Image(path, lazy=True) as image:
+        errors = image.verify()
+
+    # The block itself, and the directories listed in it
+    assert sorted((error.kind, error.offset, error.paths) for error in errors) == [
+        ("metadata", offset, []),
+        ("metadata", offset, ["dir"]),
+        ("metadata", offset, ["many"]),
+    ]
+
+    with pytest.raises(SystemExit) as e:
+        main(["verify", path])
+
+    assert e.value.code == 1
+    assert f"metadata block at {offset}: " in capsys.readouterr().out
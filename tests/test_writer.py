@@ -0,0 +1,165 @@
+import os
+
+import pytest
+
+from squashfs.common import SquashError
+from squashfs.compressor import COMPRESSORS
+from squashfs.file import SEEK_DATA, SEEK_HOLE
+from squashfs.image import Image
+from squashfs.writer import Writer, _ImageBuilder
+
+
+@pytest.mark.parametrize("compression_id", sorted(COMPRESSORS))
+def test_roundtrip(build_image, compression_id):
+    path = build_image(compression_id=compression_id, workers=4)
+
+    for lazy in [False, True]:
+        with Image(path, lazy=lazy) as image:
+            assert image.open("empty").read() == b""
+            assert image.open("small").read() == b"hello\n"
+            assert image.open("text").read() == b"squashfs " * 5000
+            assert image.open("dir/copy").read() == b"squashfs " * 5000
+            assert image.open("hardlink").read() == b"hello\n"
+            assert image.get_inode("link").target_path == b"small"
+
+            dev = image.get_inode("dev")
+            assert dev.is_block_dev and (dev.major, dev.minor) == (8, 300)
+            assert image.get_inode("fifo").is_fifo
+            assert image.get_inode("sock").is_socket
+
+            info = image.stat("dir/copy")
+            assert (info.permissions, info.uid, info.modified_time) == (
+                0o600,
+                1000,
+                1000,
+            )
+
+
+def test_directory_index(build_image):
+    path = build_image()
+
+    with Image(path, lazy=True) as image:
+        # The listing spans several metadata blocks and is indexed
+        assert len(image.get_inode("many").index) > 1
+        assert image.listdir("many") == [f"{i:05d}" for i in range(2000)]
+
+        for i in range(2000):
+            assert image.open(f"many/{i:05d}").read() == str(i).encode() * (i % 40)
+
+
+def test_dedupe(build_image):
+    path = build_image()
+
+    with Image(path) as image:
+        text = image.get_inode("text")
+        copy = image.get_inode("dir/copy")
+
+        assert text.inode_number != copy.inode_number
+        assert text.blks_start == copy.blks_start
+
+        small = image.get_inode("small")
+        assert small.inode_number == image.get_inode("hardlink").inode_number
+        assert small.hard_link_count == 2
+        assert image.hard_links() == {small.inode_number: ["hardlink", "small"]}
+
+
+def test_sparse(build_image, tmp_path):
+    path = build_image()
+    data = b"x" * 4096 + bytes(3 * 4096) + b"y" * 100
+
+    with Image(path) as image:
+        f = image.open_raw("sparse")
+
+        assert f.read() == data
+        assert f.seek(0, SEEK_HOLE) == 4096
+        assert f.seek(4096, SEEK_DATA) == 4 * 4096
+
+        image.extract("sparse", str(tmp_path / "sparse"))
+        with open(tmp_path / "sparse", "rb") as out:
+            assert out.read() == data
+
+
+def test_export_table(build_image):
+    path = build_image()
+
+    with Image(path) as image:
+        for entry in image.scandir("many"):
+            assert image.inode_by_number(entry.inode_number).inode_number == (
+                entry.inode_number
+            )
+
+        root = image.root_inode
+        assert root.inode_number == image.sblk.inode_count
+        assert root.parent_inode_number == image.sblk.inode_count + 1
+
+
+def test_add_tree(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "sub" / "file").write_bytes(b"data" * 3000)
+    os.link(src / "sub" / "file", src / "link")
+    os.symlink("sub/file", src / "symlink")
+
+    writer = Writer(blk_size=4096, workers=2, use_processes=True)
+    writer.add_tree(str(src))
+    writer.write(str(tmp_path / "tree.sfs"))
+
+    with Image(str(tmp_path / "tree.sfs")) as image:
+        assert image.listdir() == ["link", "sub", "symlink"]
+        assert image.open("sub/file").read() == b"data" * 3000
+        assert image.get_inode("link").inode_number == (
+            image.get_inode("sub/file").inode_number
+        )
+        assert image.get_inode("symlink").target_path == b"sub/file"
+
+
+@pytest.mark.parametrize("path", ["../../evil", "a/./b", "..", "a/..", "nul\0"])
+def test_invalid_names(path):
+    writer = Writer()
+
+    with pytest.raises(SquashError):
+        writer.add_file(path, b"evil")
+    with pytest.raises(SquashError):
+        writer.add_directory(path)
+
+    assert writer.root.children == {}
+
+
+def test_write_twice(tmp_path):
+    writer = Writer(blk_size=4096, modified_time=1000)
+    writer.add_file("dir/file", b"squashfs " * 1000)
+    writer.add_link("link", "dir/file")
+
+    first, second = str(tmp_path / "first.sfs"), str(tmp_path / "second.sfs")
+    writer.write(first)
+    writer.write(second)
+
+    with open(first, "rb") as f1, open(second, "rb") as f2:
+        assert f1.read() == f2.read()
+
+    with Image(second) as image:
+        assert image.open("link").read() == b"squashfs " * 1000
+
+
+def test_add_tree_file_changes(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "file").write_bytes(b"data" * 3000)
+
+    write_file = _ImageBuilder._write_file
+
+    def grow_after_reading(self, node):
+        entry = write_file(self, node)
+        with open(node.source, "ab") as f:
+            f.write(b"more" * 3000)
+        return entry
+
+    monkeypatch.setattr(_ImageBuilder, "_write_file", grow_after_reading)
+
+    writer = Writer(blk_size=4096)
+    writer.add_tree(str(src))
+    writer.write(str(tmp_path / "tree.sfs"))
+
+    with Image(str(tmp_path / "tree.sfs")) as image:
+        assert image.stat("file").size == 12000
+        assert image.open("file").read() == b"data" * 3000
@@ -1,4 +1,5 @@
 from squashfs.image import Image
+from squashfs.metadata import METADATA_SIZE, MetadataTable
 
 
 def test_xattrs():
@@ -23,3 +24,38 @@ def test_xattrs2():
                 t = bytes(str(j), "utf8")
                 assert xattrs[b"user.key" + t] == b"v" * 128 + t
                 j += 1
+
+
+def test_lazy_xattrs():
+    with Image("tests/test_xattr2.sfs") as image:
+        assert len(image.xattrs.cache) == 0
+        assert len(image.xattrs.table.cache) == 0
+
+        xattrs = image.stat("baz3").xattrs
+        assert image.stat("baz3").xattrs is xattrs
+        assert len(image.xattrs.cache) == 1
+        assert image.xattrs.cache.hits == 1
+
+    with Image("tests/test_xattr2.sfs", xattr_cache_size=0) as image:
+        for i in range(8):
+            assert len(image.stat(f"baz{i}").xattrs) == 16
+        assert len(image.xattrs.cache) == 0
+
+
+def test_xattrs_across_blocks(monkeypatch):
+    with Image("tests/test_xattr.sfs", lazy=True) as image:
+        xattrs = image.xattrs
+        expected = xattrs._decode(0)
+        # The pairs of entry 0 take 85 bytes on disk, but its size is 83
+        buffer, pos = xattrs.table.read(0, 0, 85)
+        kv = bytes(buffer[pos : pos + 85])
+
+        # Move them so that the first 84 bytes end the first metadata block
+        table = MetadataTable(image, 0, 1 << 20, lazy=True)
+        start = METADATA_SIZE - 84
+        table.cache.put(0, (bytes(start) + kv[:84], 100))
+        table.cache.put(100, (kv[84:] + bytes(100), 1 << 20))
+        monkeypatch.setattr(xattrs, "table", table)
+        monkeypatch.setattr(xattrs, "_read_lookup_entry", lambda _: (start, 1, 83))
+
+        assert xattrs._decode(0) == expected